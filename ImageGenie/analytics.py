@@ -0,0 +1,143 @@
+import numpy as np
+from sqlalchemy import select, func
+from app import db
+from models import Student, Subject, Mark, GRADE_THRESHOLDS
+from cache import cache_get, cache_set
+from export_cache import data_version
+
+STATISTICS_CACHE_KEY = 'mark_statistics'
+# Rows per fetch while loading marks; bounds the Python tuples alive at once
+STATISTICS_FETCH_SIZE = 50000
+PERCENTILES = (25, 50, 75, 90)
+# Lowest cut-off that earns a grade other than F
+PASS_PERCENTAGE = GRADE_THRESHOLDS[-1][0]
+GRADE_LABELS = [grade for _, grade in GRADE_THRESHOLDS] + ['F']
+# Ascending cut-offs for np.searchsorted, which counts the ones a percentage reaches
+_GRADE_CUTOFFS = np.array(sorted(threshold for threshold, _ in GRADE_THRESHOLDS), dtype=np.float64)
+# Score distribution in 10-point bands, 90-100 inclusive of 100
+DISTRIBUTION_BANDS = [f"{low}-{low + 10}" for low in range(0, 100, 10)]
+
+def load_marks():
+    """Every scored mark as column arrays: (student ids, subject ids, percentages)"""
+    # A Core result on the session's connection skips the ORM's per-row processing
+    result = db.session.connection().execute(
+        select(Mark.student_id, Mark.subject_id, Mark.marks_obtained, func.coalesce(Mark.total_marks, 0.0))
+        .where(Mark.marks_obtained.isnot(None))
+        .execution_options(yield_per=STATISTICS_FETCH_SIZE)
+    )
+    # Transposed per partition: numpy reads plain tuples much faster than Row objects
+    chunks = [np.array(list(zip(*rows)), dtype=np.float64) for rows in result.partitions()]
+    columns = np.concatenate(chunks, axis=1) if chunks else np.empty((4, 0))
+
+    student_ids, subject_ids, obtained, total = columns
+    # Same rule as Mark.get_percentage: no total marks scores 0
+    percentages = np.divide(obtained * 100, total, out=np.zeros_like(obtained), where=total > 0)
+    return student_ids.astype(np.int64), subject_ids.astype(np.int64), percentages
+
+def _department_codes(student_ids):
+    """Department code per mark, and the department names; -1 for inactive or no department"""
+    students = db.session.execute(
+        select(Student.id, Student.department).where(Student.is_active == True, Student.department.isnot(None))
+        .order_by(Student.id)
+    ).all()
+    if not students:
+        return np.full(len(student_ids), -1, dtype=np.int64), []
+    ids = np.array([student_id for student_id, _ in students], dtype=np.int64)
+    departments, codes = np.unique(np.array([department for _, department in students], dtype=object),
+                                   return_inverse=True)
+
+    # Marks of students outside `ids` (inactive, no department) stay at -1
+    positions = np.minimum(np.searchsorted(ids, student_ids), len(ids) - 1)
+    return np.where(ids[positions] == student_ids, codes[positions], -1), departments
+
+def group_statistics(codes, percentages, group_count):
+    """Summary statistics of percentages per group code in [0, group_count).
+
+    Every statistic is computed for all groups at once: counts, means and
+    histograms with np.bincount, and percentiles by indexing one sort of
+    the values by (group, percentage). Returns one dict per group with at
+    least one mark, keyed by its code.
+    """
+    counts = np.bincount(codes, minlength=group_count)
+    present = np.flatnonzero(counts)
+    if not len(present):
+        return {}
+
+    means = np.bincount(codes, weights=percentages, minlength=group_count) / np.maximum(counts, 1)
+    deviations = percentages - means[codes]
+    stds = np.sqrt(np.bincount(codes, weights=deviations * deviations, minlength=group_count) / np.maximum(counts, 1))
+    passed = np.bincount(codes, weights=percentages >= PASS_PERCENTAGE, minlength=group_count)
+
+    order = np.lexsort((percentages, codes))
+    ordered = percentages[order]
+    starts = np.cumsum(counts) - counts
+    # Linear interpolation between closest ranks, as numpy.percentile does by default
+    quantiles = {}
+    for percentile in PERCENTILES:
+        position = starts[present] + (counts[present] - 1) * (percentile / 100)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, starts[present] + counts[present] - 1)
+        quantiles[percentile] = dict(zip(present, ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)))
+
+    # Index into GRADE_LABELS, best grade first
+    grade_index = len(_GRADE_CUTOFFS) - np.searchsorted(_GRADE_CUTOFFS, percentages, side='right')
+    grades = np.bincount(codes * len(GRADE_LABELS) + grade_index,
+                         minlength=group_count * len(GRADE_LABELS)).reshape(group_count, len(GRADE_LABELS))
+    band_index = np.clip((percentages // 10).astype(np.int64), 0, len(DISTRIBUTION_BANDS) - 1)
+    bands = np.bincount(codes * len(DISTRIBUTION_BANDS) + band_index,
+                        minlength=group_count * len(DISTRIBUTION_BANDS)).reshape(group_count, len(DISTRIBUTION_BANDS))
+
+    return {int(code): {
+        'count': int(counts[code]),
+        'mean': round(float(means[code]), 2),
+        'std': round(float(stds[code]), 2),
+        'min': round(float(ordered[starts[code]]), 2),
+        'max': round(float(ordered[starts[code] + counts[code] - 1]), 2),
+        'percentiles': {str(percentile): round(float(quantiles[percentile][code]), 2) for percentile in PERCENTILES},
+        'pass_rate': round(float(passed[code] / counts[code] * 100), 2),
+        'grades': dict(zip(GRADE_LABELS, grades[code].tolist())),
+        'distribution': bands[code].tolist()
+    } for code in present}
+
+def compute_statistics():
+    """Statistics of mark percentages overall, per subject id and per department.
+
+    Departments cover active students only, like the department rollup.
+    Subject names are looked up by the caller, so a rename does not need
+    a recomputation.
+    """
+    student_ids, subject_ids, percentages = load_marks()
+    department_codes, departments = _department_codes(student_ids)
+
+    overall = group_statistics(np.zeros(len(percentages), dtype=np.int64), percentages, 1).get(0)
+
+    subject_keys, subject_codes = np.unique(subject_ids, return_inverse=True)
+    subjects = group_statistics(subject_codes, percentages, len(subject_keys))
+
+    in_department = department_codes >= 0
+    by_department = group_statistics(department_codes[in_department], percentages[in_department], len(departments))
+
+    return {
+        'overall': overall,
+        'subjects': [dict(stats, subject_id=int(subject_keys[code])) for code, stats in subjects.items()],
+        'departments': [dict(stats, department=str(departments[code])) for code, stats in by_department.items()]
+    }
+
+def mark_statistics():
+    """compute_statistics() for the current data version, from the shared cache when it matches.
+
+    One entry is kept and overwritten, so superseded versions do not pile up.
+    """
+    version = data_version()
+    cached = cache_get(STATISTICS_CACHE_KEY)
+    if cached is not None and cached['version'] == version:
+        statistics = cached['statistics']
+    else:
+        statistics = compute_statistics()
+        cache_set(STATISTICS_CACHE_KEY, {'version': version, 'statistics': statistics})
+
+    names = dict(db.session.execute(select(Subject.id, Subject.name)).all())
+    for subject in statistics['subjects']:
+        subject['name'] = names.get(subject['subject_id'], '')
+    statistics['subjects'].sort(key=lambda subject: subject['name'])
+    return statistics
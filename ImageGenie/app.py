@@ -1,10 +1,12 @@
 import os
 import logging
 from datetime import datetime
-from flask import Flask
+from flask import Flask, current_app, has_app_context
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy import event
+from sqlalchemy.orm import DeclarativeBase, Session, raiseload
 from werkzeug.middleware.proxy_fix import ProxyFix
+from metrics import init_metrics, pool_class_for
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -14,11 +16,21 @@ class Base(DeclarativeBase):
 
 db = SQLAlchemy(model_class=Base)
 
+@event.listens_for(Session, 'do_orm_execute')
+def _raise_on_lazy_load(orm_execute_state):
+    # With SQLALCHEMY_RAISELOAD on (default in testing), any relationship a route
+    # did not eager-load raises instead of silently issuing one query per row
+    if not has_app_context() or not current_app.config.get('SQLALCHEMY_RAISELOAD', current_app.testing):
+        return
+    if orm_execute_state.is_select and not orm_execute_state.is_relationship_load \
+            and not orm_execute_state.is_column_load:
+        orm_execute_state.statement = orm_execute_state.statement.options(raiseload('*'))
+
 def create_app():
     # Create the app
     app = Flask(__name__)
     app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
-    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1)
     
     # Configure database - Use PostgreSQL from environment or fallback to SQLite
     database_url = os.environ.get("DATABASE_URL")
@@ -31,25 +43,86 @@ def create_app():
         "pool_recycle": 300,
         "pool_pre_ping": True,
     }
+    pool_class = pool_class_for(app.config["SQLALCHEMY_DATABASE_URI"])
+    if pool_class:
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"]["poolclass"] = pool_class
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["METRICS_TOKEN"] = os.environ.get("METRICS_TOKEN")
+    if os.environ.get("SQLALCHEMY_RAISELOAD"):
+        app.config["SQLALCHEMY_RAISELOAD"] = os.environ["SQLALCHEMY_RAISELOAD"] == "1"
     
     # Upload configuration
     app.config['UPLOAD_FOLDER'] = 'static/uploads'
     app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # 5MB
+    # 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache, lighttpd) lets the proxy stream uploads;
+    # nginx needs an internal location for UPLOAD_ACCEL_PREFIX aliased to UPLOAD_FOLDER
+    app.config['UPLOAD_OFFLOAD'] = os.environ.get('UPLOAD_OFFLOAD', '')
+    app.config['UPLOAD_ACCEL_PREFIX'] = os.environ.get('UPLOAD_ACCEL_PREFIX', '/internal/uploads/')
+    app.config['IMPORT_FOLDER'] = os.environ.get('IMPORT_FOLDER', 'data/imports')
+    # CSV imports are streamed to disk, so the import route allows much larger uploads
+    app.config['IMPORT_MAX_CONTENT_LENGTH'] = int(os.environ.get('IMPORT_MAX_CONTENT_LENGTH', 1024 * 1024 * 1024))  # 1GB
+    # Jobs still processing after this long are assumed to have lost their worker and are requeued;
+    # keep it above the longest import or report
+    app.config['JOB_TIMEOUT'] = int(os.environ.get('JOB_TIMEOUT', 4 * 3600))  # seconds
+    
+    # PDF reports are rendered by the worker and kept on disk for download
+    app.config['REPORT_FOLDER'] = os.environ.get('REPORT_FOLDER', 'data/reports')
+    app.config['REPORT_PROCESSES'] = int(os.environ.get('REPORT_PROCESSES', os.cpu_count() or 1))
+    # Generated exports are reused until the data changes; least recently used go first
+    app.config['EXPORT_CACHE_FOLDER'] = os.environ.get('EXPORT_CACHE_FOLDER', 'data/exports')
+    app.config['EXPORT_CACHE_MAX_BYTES'] = int(os.environ.get('EXPORT_CACHE_MAX_BYTES', 512 * 1024 * 1024))  # 512MB
+    # Searches per client IP per window on the public result search, in each worker process
+    app.config['RESULT_SEARCH_RATE_LIMIT'] = int(os.environ.get('RESULT_SEARCH_RATE_LIMIT', 10))
+    app.config['RESULT_SEARCH_RATE_WINDOW'] = int(os.environ.get('RESULT_SEARCH_RATE_WINDOW', 60))  # seconds
+    # `flask publish-results` renders every result page into releases under this folder; with
+    # SERVE_PUBLISHED_RESULTS the search answers from its index and redirects under PUBLISHED_RESULTS_URL
+    app.config['PUBLISHED_RESULTS_FOLDER'] = os.environ.get('PUBLISHED_RESULTS_FOLDER', 'data/published')
+    app.config['PUBLISHED_RESULTS_URL'] = os.environ.get('PUBLISHED_RESULTS_URL', '/published')
+    app.config['SERVE_PUBLISHED_RESULTS'] = os.environ.get('SERVE_PUBLISHED_RESULTS') == '1'
+    # Audit events are batched by a background thread; AUDIT_SYNCHRONOUS=1 writes each one as it
+    # happens instead (e.g. for tests or one-off scripts that exit right away)
+    app.config['AUDIT_SYNCHRONOUS'] = os.environ.get('AUDIT_SYNCHRONOUS') == '1'
+    app.config['AUDIT_BATCH_SIZE'] = int(os.environ.get('AUDIT_BATCH_SIZE', 200))
+    app.config['AUDIT_FLUSH_INTERVAL'] = float(os.environ.get('AUDIT_FLUSH_INTERVAL', 1.0))  # seconds
+    app.config['AUDIT_QUEUE_SIZE'] = int(os.environ.get('AUDIT_QUEUE_SIZE', 10000))
+    # Audit rows older than the retention window are moved to gzipped NDJSON by `flask archive-audit`
+    app.config['AUDIT_RETENTION_DAYS'] = int(os.environ.get('AUDIT_RETENTION_DAYS', 180))
+    app.config['AUDIT_ARCHIVE_FOLDER'] = os.environ.get('AUDIT_ARCHIVE_FOLDER', 'data/audit_archive')
     
     # Initialize extensions
     db.init_app(app)
     
     # Create upload directory
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['IMPORT_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['REPORT_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['EXPORT_CACHE_FOLDER'], exist_ok=True)
     
     with app.app_context():
+        # Instrument the engine before any query runs
+        init_metrics(app, db.engine)
+        # Audit events are written in batches by a background thread
+        from audit import init_audit
+        init_audit(app, db.engine)
+        
         # Import models to ensure tables are created
         import models
+        # Registers the session hooks that keep result summaries in sync
+        import summaries
+        # ...and the analytics rollups
+        import rollups
+        # ...and the ones that invalidate cached filter facets
+        import facets
+        # ...and cached public result pages
+        import results_cache
         
         # Create all tables
         db.create_all()
         
+        # Dialect-specific full-text/trigram index for the student search
+        from search import install_search_index
+        install_search_index(app)
+        
         # Create default admin user if not exists
         from models import User
         admin = User.query.filter_by(username='admin').first()
@@ -76,10 +149,18 @@ def create_app():
             'error_datetime': now.strftime('%Y-%m-%d %H:%M:%S')
         }
     
+    # Responsive student photo URLs, see images.py
+    from images import photo_srcset, photo_url
+    app.jinja_env.globals.update(photo_srcset=photo_srcset, photo_url=photo_url)
+    
     # Register routes
     from routes import register_routes
     register_routes(app)
     
+    # Register CLI commands
+    from commands import register_commands
+    register_commands(app)
+    
     return app
 
 app = create_app()
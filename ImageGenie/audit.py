@@ -0,0 +1,258 @@
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime
+from flask import has_request_context, request, session as flask_session
+from sqlalchemy import insert, select, event, inspect, tuple_
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+from app import db
+from models import AuditLog, User, Student, Subject, Mark
+from metrics import registry
+from pagination import encode_cursor, decode_cursor
+from session_hooks import on_commit
+
+AUDIT_BATCH_SIZE = 200
+AUDIT_FLUSH_INTERVAL = 1.0  # seconds
+AUDIT_QUEUE_SIZE = 10000
+AUDIT_SHUTDOWN_TIMEOUT = 5.0  # seconds
+
+# Models whose row changes are captured automatically
+AUDITED_MODELS = (Student, Subject, Mark)
+# Bookkeeping columns; the audit row's own timestamp already says when
+AUDIT_IGNORED_COLUMNS = {'created_at', 'updated_at'}
+AUDIT_HISTORY_LIMIT = 50
+
+_STOP = object()
+
+class AuditWriter:
+    """Buffers audit rows in memory and inserts them in batches from a background thread.
+
+    Requests only pay for a queue put. A batch is written once it reaches
+    batch_size rows or flush_interval seconds after its first row, as one
+    multi-row INSERT on the writer's own connection.
+    """
+
+    def __init__(self, batch_size=AUDIT_BATCH_SIZE, flush_interval=AUDIT_FLUSH_INTERVAL,
+                 queue_size=AUDIT_QUEUE_SIZE):
+        self.engine = None
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.synchronous = False
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+
+    def configure(self, engine, batch_size=None, flush_interval=None, queue_size=None, synchronous=False):
+        self.engine = engine
+        self.synchronous = synchronous
+        self.batch_size = batch_size or self.batch_size
+        self.flush_interval = flush_interval or self.flush_interval
+        self.queue_size = queue_size or self.queue_size
+
+    def _ensure_started(self):
+        # Threads do not survive fork, so each worker process starts its own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def record(self, row):
+        """Queue one audit row (a dict of AuditLog columns); never blocks the caller"""
+        if self.synchronous:
+            self._write([row])
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            count_dropped('queue_full')
+
+    def _run(self):
+        pending = []
+        deadline = None
+        stopping = False
+        while not stopping:
+            try:
+                # Wait indefinitely for a first row, then until its batch is due
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0) if pending else None)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                stopping = True
+            elif item is not None:
+                if not pending:
+                    deadline = time.monotonic() + self.flush_interval
+                pending.append(item)
+                if len(pending) < self.batch_size:
+                    continue
+
+            if pending:
+                self._write(pending)
+                pending = []
+
+    def _write(self, rows):
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(insert(AuditLog), rows)
+            registry.inc('audit_events_written_total', value=len(rows),
+                         help_text='Audit events written to the database.')
+        except Exception:
+            logging.exception(f"Failed to write {len(rows)} audit events")
+            count_dropped('write_error', len(rows))
+
+    def stop(self, timeout=AUDIT_SHUTDOWN_TIMEOUT):
+        """Flush whatever is queued and stop the thread"""
+        if self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+def count_dropped(reason, count=1):
+    registry.inc('audit_events_dropped_total', (('reason', reason),), count,
+                 help_text='Audit events discarded without being written.')
+
+audit_writer = AuditWriter()
+atexit.register(audit_writer.stop)
+
+def init_audit(app, engine):
+    audit_writer.configure(
+        engine,
+        batch_size=app.config.get('AUDIT_BATCH_SIZE'),
+        flush_interval=app.config.get('AUDIT_FLUSH_INTERVAL'),
+        queue_size=app.config.get('AUDIT_QUEUE_SIZE'),
+        # An in-memory SQLite database is one connection that cannot be shared with a thread
+        synchronous=app.config.get('AUDIT_SYNCHRONOUS') or isinstance(engine.pool, StaticPool)
+    )
+
+def _dumps(values):
+    return json.dumps(values, default=str, separators=(',', ':')) if values else None
+
+def audit_row(action, table_name, record_id, old_values=None, new_values=None):
+    """AuditLog column values for one event, attributed to the current request's user"""
+    in_request = has_request_context()
+    return {
+        'user_id': flask_session.get('user_id') if in_request else None,
+        'action': action,
+        'table_name': table_name,
+        'record_id': record_id,
+        'old_values': _dumps(old_values),
+        'new_values': _dumps(new_values),
+        'timestamp': datetime.utcnow(),
+        'ip_address': request.remote_addr if in_request else None
+    }
+
+def _column_changes(obj, action):
+    """(old, new) dicts holding only the columns this flush changed"""
+    state = inspect(obj)
+    old_values, new_values = {}, {}
+    for attr in state.mapper.column_attrs:
+        key = attr.key
+        if key in AUDIT_IGNORED_COLUMNS:
+            continue
+        if action == 'CREATE':
+            if state.dict.get(key) is not None:
+                new_values[key] = state.dict[key]
+        elif action == 'DELETE':
+            if state.dict.get(key) is not None:
+                old_values[key] = state.dict[key]
+        else:
+            history = state.attrs[key].history
+            if history.has_changes():
+                old_values[key] = history.deleted[0] if history.deleted else None
+                new_values[key] = history.added[0] if history.added else None
+    return old_values, new_values
+
+def _load_replaced_values(models):
+    """Load a column's committed value before an assignment replaces it.
+
+    Columns of an expired object, e.g. one used after a commit, are not
+    loaded when assigned. The diff would then have no old value and would
+    log re-assigning the current value as a change. One load refreshes all
+    of an object's expired columns.
+    """
+    for model in models:
+        for attr in inspect(model).column_attrs:
+            event.listen(getattr(model, attr.key), 'set', lambda target, value, oldvalue, initiator: None,
+                         active_history=True)
+
+_load_replaced_values(AUDITED_MODELS)
+
+@event.listens_for(Session, 'after_flush')
+def _capture_changes(session, flush_context):
+    # History is still intact here and new rows already have their ids
+    changes = [(obj, 'CREATE') for obj in session.new] + \
+              [(obj, 'UPDATE') for obj in session.dirty] + \
+              [(obj, 'DELETE') for obj in session.deleted]
+    for obj, action in changes:
+        if not isinstance(obj, AUDITED_MODELS):
+            continue
+        old_values, new_values = _column_changes(obj, action)
+        if action == 'UPDATE':
+            if not new_values:
+                continue
+            if isinstance(obj, Student) and new_values.get('is_active') is False:
+                action = 'DELETE'  # Students are deactivated rather than removed
+        record_id = inspect(obj).mapper.primary_key_from_instance(obj)[0]
+        # Queued for the writer only once the change is committed
+        on_commit(session, 'audit_rows', [audit_row(action, obj.__tablename__, record_id, old_values, new_values)],
+                  _queue_captured_changes, after=True)
+
+def _queue_captured_changes(session, rows):
+    for row in rows:
+        audit_writer.record(row)
+
+def _changes(old_values, new_values):
+    old_values = json.loads(old_values) if old_values else {}
+    new_values = json.loads(new_values) if new_values else {}
+    return {
+        key: {'old': old_values.get(key), 'new': new_values.get(key)}
+        for key in sorted(set(old_values) | set(new_values))
+        if not key.startswith('_')  # Older rows serialized the whole instance dict
+    }
+
+def record_history(table_name, record_id, before=None, limit=AUDIT_HISTORY_LIMIT):
+    """Audit entries for one record, newest first, one index range scan per page"""
+    query = select(
+        AuditLog.id, AuditLog.action, AuditLog.timestamp, AuditLog.ip_address,
+        AuditLog.old_values, AuditLog.new_values, User.username
+    ).outerjoin(User, User.id == AuditLog.user_id).where(
+        AuditLog.table_name == table_name,
+        AuditLog.record_id == record_id
+    )
+    cursor = decode_cursor(before, 2)
+    if cursor is not None:
+        query = query.where(tuple_(AuditLog.timestamp, AuditLog.id) <
+                            tuple_(datetime.fromisoformat(cursor[0]), cursor[1]))
+    rows = db.session.execute(
+        query.order_by(AuditLog.timestamp.desc(), AuditLog.id.desc()).limit(limit + 1)
+    ).all()
+
+    entries = [{
+        'id': row.id,
+        'action': row.action,
+        'user': row.username,
+        'timestamp': row.timestamp.isoformat() if row.timestamp else None,
+        'ip_address': row.ip_address,
+        'changes': _changes(row.old_values, row.new_values)
+    } for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor([last.timestamp.isoformat(), last.id])
+    return {'entries': entries, 'next': next_cursor}
@@ -0,0 +1,159 @@
+"""Monthly archiving of audit_logs to compressed NDJSON, and an offline search over the archive.
+
+The hot table keeps the retention window; each calendar month that falls
+entirely outside it is written to audit_logs_YYYY_MM_<first id>-<last id>.ndjson.gz
+and then deleted from the database. Searching only needs the files:
+
+    python audit_archive.py data/audit_archive --table students --record-id 42
+"""
+import os
+import sys
+import gzip
+import json
+import argparse
+from datetime import datetime, timedelta
+
+ARCHIVE_PREFIX = 'audit_logs_'
+ARCHIVE_SUFFIX = '.ndjson.gz'
+ARCHIVE_BATCH_SIZE = 5000
+
+COLUMNS = ('id', 'user_id', 'action', 'table_name', 'record_id', 'old_values', 'new_values',
+           'timestamp', 'ip_address')
+
+def month_start(moment):
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def next_month(moment):
+    return month_start(month_start(moment) + timedelta(days=32))
+
+def _serialize(row):
+    record = dict(zip(COLUMNS, row))
+    record['timestamp'] = record['timestamp'].isoformat() if record['timestamp'] else None
+    return json.dumps(record, separators=(',', ':'))
+
+def archive_month(start, folder, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move one month of audit rows to an archive file; returns (rows archived, path)"""
+    from sqlalchemy import select, delete, func
+    from app import db
+    from models import AuditLog
+
+    end = next_month(start)
+    in_month = (AuditLog.timestamp >= start, AuditLog.timestamp < end)
+    first_id, last_id = db.session.execute(
+        select(func.min(AuditLog.id), func.max(AuditLog.id)).where(*in_month)
+    ).one()
+    if first_id is None:
+        return 0, None
+
+    path = os.path.join(folder, f"{ARCHIVE_PREFIX}{start:%Y_%m}_{first_id}-{last_id}{ARCHIVE_SUFFIX}")
+    tmp_path = f"{path}.tmp"
+    count = 0
+    result = db.session.execute(
+        select(*(getattr(AuditLog, column) for column in COLUMNS))
+        .where(*in_month, AuditLog.id <= last_id)
+        .order_by(AuditLog.id)
+        .execution_options(stream_results=True, yield_per=batch_size)
+    )
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        for row in result:
+            f.write(_serialize(row) + '\n')
+            count += 1
+    # Only a complete file becomes visible, and only then are rows deleted
+    os.replace(tmp_path, path)
+    db.session.commit()
+
+    # Short transactions, so the live audit writer is never blocked for long
+    lower = first_id
+    while lower <= last_id:
+        upper = min(lower + batch_size - 1, last_id)
+        db.session.execute(delete(AuditLog).where(*in_month, AuditLog.id.between(lower, upper)))
+        db.session.commit()
+        lower = upper + 1
+
+    return count, path
+
+def archive_expired(retention_days, folder, now=None):
+    """Archive every month that ended before the retention window; returns [(month, rows, path)]"""
+    from sqlalchemy import select, func
+    from app import db
+    from models import AuditLog
+
+    os.makedirs(folder, exist_ok=True)
+    cutoff = (now or datetime.utcnow()) - timedelta(days=retention_days)
+    oldest = db.session.execute(select(func.min(AuditLog.timestamp))).scalar()
+    db.session.commit()
+
+    archived = []
+    month = month_start(oldest) if oldest else None
+    while month is not None and next_month(month) <= cutoff:
+        count, path = archive_month(month, folder)
+        if count:
+            archived.append((month, count, path))
+        month = next_month(month)
+    return archived
+
+def _file_month(filename):
+    try:
+        return datetime.strptime(filename[len(ARCHIVE_PREFIX):len(ARCHIVE_PREFIX) + 7], '%Y_%m')
+    except ValueError:
+        return None
+
+def archive_files(folder, since=None, until=None):
+    """Archive files whose month overlaps [since, until), oldest first"""
+    if not os.path.isdir(folder):
+        return []
+    files = []
+    for name in os.listdir(folder):
+        if not (name.startswith(ARCHIVE_PREFIX) and name.endswith(ARCHIVE_SUFFIX)):
+            continue
+        month = _file_month(name)
+        if month is None:
+            continue
+        if (since and next_month(month) <= since) or (until and month >= until):
+            continue
+        files.append((month, name))
+    return [os.path.join(folder, name) for _, name in sorted(files)]
+
+def search_archive(folder, table_name=None, record_id=None, action=None, user_id=None,
+                   since=None, until=None):
+    """Yield archived audit records matching every given filter, oldest month first"""
+    seen_ids = set()  # A rerun after a crash between write and delete can archive rows twice
+    for path in archive_files(folder, since, until):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                if table_name and record['table_name'] != table_name:
+                    continue
+                if record_id is not None and record['record_id'] != record_id:
+                    continue
+                if action and record['action'] != action:
+                    continue
+                if user_id is not None and record['user_id'] != user_id:
+                    continue
+                timestamp = datetime.fromisoformat(record['timestamp']) if record['timestamp'] else None
+                if since and (timestamp is None or timestamp < since):
+                    continue
+                if until and (timestamp is None or timestamp >= until):
+                    continue
+                if record['id'] in seen_ids:
+                    continue
+                seen_ids.add(record['id'])
+                yield record
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Search archived audit logs without a database.')
+    parser.add_argument('folder', help='Archive folder (AUDIT_ARCHIVE_FOLDER)')
+    parser.add_argument('--table', dest='table_name')
+    parser.add_argument('--record-id', type=int)
+    parser.add_argument('--action')
+    parser.add_argument('--user-id', type=int)
+    parser.add_argument('--since', type=datetime.fromisoformat, help='Inclusive, e.g. 2025-01-01')
+    parser.add_argument('--until', type=datetime.fromisoformat, help='Exclusive')
+    args = parser.parse_args(argv)
+
+    for record in search_archive(args.folder, args.table_name, args.record_id, args.action,
+                                 args.user_id, args.since, args.until):
+        sys.stdout.write(json.dumps(record) + '\n')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, or_
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app import db
+from models import CacheEntry
+
+def cache_get(key):
+    """Cached value for key, or None when missing or expired"""
+    value = db.session.execute(
+        select(CacheEntry.value).where(
+            CacheEntry.key == key,
+            or_(CacheEntry.expires_at.is_(None), CacheEntry.expires_at > datetime.utcnow())
+        )
+    ).scalar()
+    return json.loads(value) if value is not None else None
+
+def cache_set(key, value, ttl=None):
+    """Store value under key in its own transaction, so callers' pending work is untouched"""
+    row = {
+        'key': key,
+        'value': json.dumps(value),
+        'expires_at': datetime.utcnow() + timedelta(seconds=ttl) if ttl else None
+    }
+    with db.engine.begin() as connection:
+        dialect = connection.dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            stmt = (postgresql_insert if dialect == 'postgresql' else sqlite_insert)(CacheEntry).values(row)
+            connection.execute(stmt.on_conflict_do_update(
+                index_elements=['key'],
+                set_={'value': stmt.excluded.value, 'expires_at': stmt.excluded.expires_at}
+            ))
+        else:
+            connection.execute(delete(CacheEntry).where(CacheEntry.key == key))
+            connection.execute(CacheEntry.__table__.insert().values(row))
+
+def cache_delete(*keys, session=None):
+    """Drop keys as part of session's transaction, so readers never see them outlive the change"""
+    (session or db.session).execute(delete(CacheEntry).where(CacheEntry.key.in_(keys)))
+
+def cache_delete_prefix(prefix, session=None):
+    """Drop every key starting with prefix as part of session's transaction"""
+    (session or db.session).execute(delete(CacheEntry).where(CacheEntry.key.startswith(prefix, autoescape=True)))
@@ -0,0 +1,88 @@
+import os
+import json
+import click
+from flask import current_app
+from summaries import rebuild_student_summaries
+from rollups import rebuild_rollups
+from jobs import run_worker_pool, work
+from images import backfill_derivatives, collect_orphan_photos, ORPHAN_MIN_AGE
+from publish import publish_results
+from audit_archive import archive_expired, search_archive
+
+def register_commands(app):
+    
+    @app.cli.command('rebuild-summaries')
+    @click.option('--chunk-size', default=500, show_default=True, help='Students refreshed per transaction.')
+    def rebuild_summaries(chunk_size):
+        """Backfill or repair the student_result_summary table."""
+        total = rebuild_student_summaries(chunk_size=chunk_size)
+        click.echo(f'Rebuilt result summaries for {total} students.')
+    
+    @app.cli.command('rebuild-photos')
+    @click.option('--force', is_flag=True, help='Re-render photos that already have derivatives.')
+    def rebuild_photos(force):
+        """Create thumbnail and WebP derivatives for stored student photos."""
+        rendered, failed = backfill_derivatives(force)
+        click.echo(f'Resized {rendered} photos ({failed} failed).')
+    
+    @app.cli.command('gc-photos')
+    @click.option('--min-age', default=ORPHAN_MIN_AGE, show_default=True,
+                  help='Seconds an unreferenced file must have existed before it is removed.')
+    @click.option('--dry-run', is_flag=True, help='Report what would be removed without deleting.')
+    @click.option('--include-inactive', is_flag=True,
+                  help='Also remove photos only deactivated students refer to, clearing their photo.')
+    def gc_photos(min_age, dry_run, include_inactive):
+        """Remove uploaded photos and derivatives that no student refers to."""
+        files, freed = collect_orphan_photos(min_age, dry_run, include_inactive)
+        verb = 'Would remove' if dry_run else 'Removed'
+        click.echo(f'{verb} {files} files ({freed / (1024 * 1024):.1f} MB).')
+    
+    @app.cli.command('rebuild-rollups')
+    def rebuild_rollups_command():
+        """Backfill or repair the analytics rollup table."""
+        months = rebuild_rollups()
+        click.echo(f'Rebuilt analytics rollups for {months} months.')
+    
+    @app.cli.command('worker')
+    @click.option('--processes', default=2, show_default=True, help='Worker processes to run in parallel.')
+    @click.option('--poll-interval', default=2.0, show_default=True, help='Seconds between queue polls when idle.')
+    @click.option('--once', is_flag=True, help='Drain the queue in this process and exit.')
+    def worker(processes, poll_interval, once):
+        """Process queued bulk imports."""
+        if once:
+            work(poll_interval, once=True)
+        else:
+            click.echo(f'Starting {processes} import worker(s).')
+            run_worker_pool(processes, poll_interval)
+    
+    @app.cli.command('publish-results')
+    @click.option('--processes', default=os.cpu_count() or 1, show_default=True, help='Renderer processes to run in parallel.')
+    def publish(processes):
+        """Render every active student's result into a new static release."""
+        count, release = publish_results(processes)
+        click.echo(f'Published {count} results to {release}.')
+    
+    @app.cli.command('archive-audit')
+    @click.option('--retention-days', type=int, help='Days kept in the database (default AUDIT_RETENTION_DAYS).')
+    def archive_audit(retention_days):
+        """Move whole months of expired audit logs to the archive folder."""
+        if retention_days is None:
+            retention_days = current_app.config['AUDIT_RETENTION_DAYS']
+        archived = archive_expired(retention_days, current_app.config['AUDIT_ARCHIVE_FOLDER'])
+        for month, count, path in archived:
+            click.echo(f'{month:%Y-%m}: archived {count} audit rows to {path}')
+        if not archived:
+            click.echo('No expired audit months to archive.')
+    
+    @app.cli.command('audit-search')
+    @click.option('--table', 'table_name', help='Only entries for this table.')
+    @click.option('--record-id', type=int, help='Only entries for this record.')
+    @click.option('--action', help='Only this action, e.g. UPDATE.')
+    @click.option('--user-id', type=int, help='Only entries made by this user.')
+    @click.option('--since', type=click.DateTime(), help='Inclusive start time.')
+    @click.option('--until', type=click.DateTime(), help='Exclusive end time.')
+    def audit_search(table_name, record_id, action, user_id, since, until):
+        """Search archived audit logs as NDJSON."""
+        for record in search_archive(current_app.config['AUDIT_ARCHIVE_FOLDER'], table_name, record_id,
+                                     action, user_id, since, until):
+            click.echo(json.dumps(record))
@@ -0,0 +1,102 @@
+import os
+import hashlib
+import tempfile
+from flask import current_app, request, send_file
+from sqlalchemy import select, func
+from app import db
+from models import Student, Subject, Mark
+
+def data_version():
+    """Fingerprint of everything an export reads.
+
+    Row counts catch hard deletes; max(updated_at) catches inserts and edits,
+    including soft deletes and upserted marks, which all stamp it.
+    """
+    fingerprint = db.session.execute(select(
+        select(func.count(Student.id)).scalar_subquery(),
+        select(func.max(Student.updated_at)).scalar_subquery(),
+        select(func.count(Mark.id)).scalar_subquery(),
+        select(func.max(Mark.updated_at)).scalar_subquery(),
+        select(func.count(Subject.id)).scalar_subquery(),
+        select(func.max(Subject.id)).scalar_subquery()
+    )).one()
+    return hashlib.sha1(repr(tuple(fingerprint)).encode()).hexdigest()[:20]
+
+def export_etag(format, version):
+    return f"{format}-{version}"
+
+def not_modified(etag):
+    """304 for a client that already holds this version, otherwise None"""
+    if not request.if_none_match.contains(etag):
+        return None
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def artifact_path(format, version, extension):
+    return os.path.join(current_app.config['EXPORT_CACHE_FOLDER'], f"student_results_{format}_{version}.{extension}")
+
+def cached_artifact(path):
+    """Return path if the artifact exists, marking it recently used"""
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+def artifact_writer(path):
+    """Open a temp file beside path; commit_artifact() moves it into place"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    return os.fdopen(fd, 'w+b'), tmp_path
+
+def commit_artifact(tmp_path, path):
+    # Concurrent builders of the same version each rename a complete file
+    os.replace(tmp_path, path)
+    evict_artifacts(keep=path)
+
+def discard_artifact(tmp_path):
+    try:
+        os.remove(tmp_path)
+    except FileNotFoundError:
+        pass
+
+def evict_artifacts(max_bytes=None, keep=None):
+    """Delete least recently used exports and reports until under the size budget"""
+    if max_bytes is None:
+        max_bytes = current_app.config['EXPORT_CACHE_MAX_BYTES']
+
+    entries = []
+    for folder in (current_app.config['EXPORT_CACHE_FOLDER'], current_app.config['REPORT_FOLDER']):
+        if not os.path.isdir(folder):
+            continue
+        for entry in os.scandir(folder):
+            # In-progress temp files and report work directories are left alone
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue  # About to be served
+        discard_artifact(path)
+        total -= size
+
+def artifact_response(path, etag, mimetype, download_name):
+    """Serve a stored artifact with a strong ETag, answering conditional GETs"""
+    response = send_file(
+        os.path.abspath(path),
+        mimetype=mimetype,
+        as_attachment=True,
+        download_name=download_name,
+        etag=etag,
+        conditional=True,
+        max_age=0
+    )
+    # Browsers may keep the file but must revalidate before reusing it
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
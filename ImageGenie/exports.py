@@ -0,0 +1,155 @@
+import csv
+from io import StringIO
+from flask import Response, stream_with_context
+from openpyxl import Workbook
+from sqlalchemy import select, func
+from app import db
+from models import Student, Subject, Mark, StudentResultSummary, grade_for_percentage
+from export_cache import (data_version, export_etag, not_modified, artifact_path, cached_artifact,
+                          artifact_writer, commit_artifact, discard_artifact, artifact_response)
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Students fetched per server-side cursor batch (and per marks lookup)
+EXPORT_CHUNK_SIZE = 1000
+
+BASE_COLUMNS = ['Roll No', 'Name', 'Email', 'Phone', 'Date of Birth', 'Department', 'Semester',
+                'Admission Year', 'Total Marks', 'Percentage', 'Grade']
+
+def subject_columns():
+    """(subject code, exam type) pairs that appear in marks, in a stable order"""
+    return db.session.execute(
+        select(Subject.code, Mark.exam_type).join(Mark, Mark.subject_id == Subject.id)
+        .distinct().order_by(Subject.code, Mark.exam_type)
+    ).all()
+
+def iter_student_batches(chunk_size=EXPORT_CHUNK_SIZE):
+    """Stream active students with their summary through a server-side cursor"""
+    result = db.session.execute(
+        select(
+            Student.id, Student.roll_no, Student.name, Student.email, Student.phone,
+            Student.date_of_birth, Student.department, Student.semester, Student.admission_year,
+            func.coalesce(StudentResultSummary.total_obtained, 0.0),
+            func.coalesce(StudentResultSummary.percentage, 0.0)
+        ).outerjoin(StudentResultSummary, StudentResultSummary.student_id == Student.id)
+        .where(Student.is_active == True)
+        .order_by(Student.id)
+        .execution_options(stream_results=True, yield_per=chunk_size)
+    )
+    yield from result.partitions()
+
+def iter_export_rows(columns, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield one flat row per active student: base fields, then one cell per subject column"""
+    column_index = {column: i for i, column in enumerate(columns)}
+
+    for batch in iter_student_batches(chunk_size):
+        marks_by_student = {}
+        for student_id, code, exam_type, marks_obtained in db.session.execute(
+            select(Mark.student_id, Subject.code, Mark.exam_type, Mark.marks_obtained)
+            .join(Subject, Subject.id == Mark.subject_id)
+            .where(Mark.student_id.in_([row[0] for row in batch]))
+        ):
+            index = column_index.get((code, exam_type))
+            if index is None:
+                continue  # Written after the header was fixed
+            marks_by_student.setdefault(student_id, [None] * len(columns))[index] = marks_obtained
+
+        for (student_id, roll_no, name, email, phone, dob, department, semester,
+             admission_year, total_obtained, percentage) in batch:
+            yield [
+                roll_no,
+                name,
+                email,
+                phone,
+                dob.strftime('%Y-%m-%d') if dob else '',
+                department,
+                semester,
+                admission_year,
+                total_obtained,
+                round(percentage, 2),
+                grade_for_percentage(percentage)
+            ] + marks_by_student.get(student_id, [None] * len(columns))
+
+def _header(columns):
+    return BASE_COLUMNS + [f"{code} ({exam_type})" for code, exam_type in columns]
+
+def excel_export_response(filename='student_results.xlsx'):
+    """Serve the workbook for the current data version, building it on a cache miss"""
+    version = data_version()
+    etag = export_etag('excel', version)
+    response = not_modified(etag)
+    if response:
+        return response
+
+    path = artifact_path('excel', version, 'xlsx')
+    if not cached_artifact(path):
+        columns = subject_columns()
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('Student Results')
+        sheet.append(_header(columns))
+        for row in iter_export_rows(columns):
+            sheet.append(row)
+
+        # The xlsx zip can only be finalized once every row is written; it is
+        # spooled straight into the cache and streamed back from there
+        output, tmp_path = artifact_writer(path)
+        try:
+            with output:
+                workbook.save(output)
+        except Exception:
+            discard_artifact(tmp_path)
+            raise
+        commit_artifact(tmp_path, path)
+
+    return artifact_response(path, etag, XLSX_MIMETYPE, filename)
+
+def csv_export_response(filename='student_results.csv'):
+    """Stream the export as CSV; the first bytes go out before the query finishes.
+
+    A miss is written through to the cache as it streams, so the next download
+    of the same version is served from disk.
+    """
+    version = data_version()
+    etag = export_etag('csv', version)
+    response = not_modified(etag)
+    if response:
+        return response
+
+    path = artifact_path('csv', version, 'csv')
+    if cached_artifact(path):
+        return artifact_response(path, etag, 'text/csv', filename)
+
+    columns = subject_columns()
+
+    def generate():
+        output, tmp_path = artifact_writer(path)
+        complete = False
+        try:
+            buffer = StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(_header(columns))
+            for i, row in enumerate(iter_export_rows(columns), start=1):
+                writer.writerow(row)
+                if i % EXPORT_CHUNK_SIZE == 0:
+                    chunk = buffer.getvalue()
+                    output.write(chunk.encode('utf-8'))
+                    yield chunk
+                    buffer.seek(0)
+                    buffer.truncate()
+            chunk = buffer.getvalue()
+            output.write(chunk.encode('utf-8'))
+            yield chunk
+            complete = True
+        finally:
+            output.close()
+            # A disconnected client leaves a partial file that must not be cached
+            if complete:
+                commit_artifact(tmp_path, path)
+            else:
+                discard_artifact(tmp_path)
+
+    response = Response(stream_with_context(generate()), mimetype='text/csv')
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,57 @@
+from sqlalchemy import event, inspect, select, func
+from sqlalchemy.orm import Session
+from app import db
+from models import Student
+from cache import cache_get, cache_set, cache_delete
+from session_hooks import on_commit
+
+FACETS_CACHE_KEY = 'student_facets'
+# A rebuild that read just before a write committed can store old counts; they expire after this
+FACETS_TTL = 600  # seconds
+
+# Student columns whose changes move a student between facet buckets
+FACET_COLUMNS = ('department', 'semester', 'is_active')
+
+def _facet_counts(column):
+    return [list(row) for row in db.session.execute(
+        select(column, func.count(Student.id))
+        .where(Student.is_active == True, column.isnot(None))
+        .group_by(column)
+        .order_by(column)
+    )]
+
+def student_facets():
+    """Department and semester filter options with active student counts.
+
+    Returns {'departments': [[name, count], ...], 'semesters': [[semester, count], ...]},
+    built with one GROUP BY per facet and kept in the shared cache until a
+    student write invalidates it.
+    """
+    facets = cache_get(FACETS_CACHE_KEY)
+    if facets is None:
+        facets = {
+            'departments': _facet_counts(Student.department),
+            'semesters': _facet_counts(Student.semester)
+        }
+        cache_set(FACETS_CACHE_KEY, facets, ttl=FACETS_TTL)
+    return facets
+
+def invalidate_facets(session):
+    """Drop the cached facets when session commits; for Core writes the ORM hooks cannot see"""
+    on_commit(session, FACETS_CACHE_KEY, [True], _drop_facets)
+
+def _drop_facets(session, _):
+    cache_delete(FACETS_CACHE_KEY, session=session)
+
+@event.listens_for(Session, 'after_flush')
+def _collect_student_changes(session, flush_context):
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, Student):
+            invalidate_facets(session)
+            return
+    for obj in session.dirty:
+        if isinstance(obj, Student):
+            attrs = inspect(obj).attrs
+            if any(attrs[name].history.has_changes() for name in FACET_COLUMNS):
+                invalidate_facets(session)
+                return
@@ -1,10 +1,13 @@
 from flask_wtf import FlaskForm
 from flask_wtf.file import FileField, FileAllowed
-from wtforms import StringField, IntegerField, FloatField, DateField, TextAreaField, SelectField, PasswordField, BooleanField
+from wtforms import StringField, IntegerField, FloatField, DateField, TextAreaField, SelectField, PasswordField, BooleanField, HiddenField
 from wtforms.validators import DataRequired, Email, Length, NumberRange, Optional, ValidationError
 from models import Student, Subject, User
 from app import db
 
+def _to_id(value):
+    return int(value) if value and str(value).isdigit() else None
+
 class LoginForm(FlaskForm):
     username = StringField('Username', validators=[DataRequired(), Length(min=3, max=80)])
     password = PasswordField('Password', validators=[DataRequired()])
@@ -51,8 +54,11 @@ class SubjectForm(FlaskForm):
             raise ValidationError('Subject code already exists.')
 
 class MarkForm(FlaskForm):
-    student_id = SelectField('Student', coerce=int, validators=[DataRequired()])
-    subject_id = SelectField('Subject', coerce=int, validators=[DataRequired()])
+    # Chosen through typeaheads on the *_search inputs, which fill in these ids
+    student_id = HiddenField('Student', filters=[_to_id], validators=[DataRequired('Choose a student from the suggestions.')])
+    subject_id = HiddenField('Subject', filters=[_to_id], validators=[DataRequired('Choose a subject from the suggestions.')])
+    student_search = StringField('Student', validators=[Optional()])
+    subject_search = StringField('Subject', validators=[Optional()])
     marks_obtained = FloatField('Marks Obtained', validators=[DataRequired(), NumberRange(min=0)])
     total_marks = FloatField('Total Marks', validators=[DataRequired(), NumberRange(min=1)])
     exam_type = SelectField('Exam Type', choices=[
@@ -64,10 +70,13 @@ class MarkForm(FlaskForm):
     ], validators=[DataRequired()])
     exam_date = DateField('Exam Date', validators=[Optional()])
     
-    def __init__(self, *args, **kwargs):
-        super(MarkForm, self).__init__(*args, **kwargs)
-        self.student_id.choices = [(s.id, f"{s.roll_no} - {s.name}") for s in Student.query.filter_by(is_active=True).order_by(Student.roll_no).all()]
-        self.subject_id.choices = [(s.id, f"{s.code} - {s.name}") for s in Subject.query.filter_by(is_active=True).order_by(Subject.code).all()]
+    def validate_student_id(self, field):
+        if db.session.query(Student.id).filter_by(id=field.data, is_active=True).first() is None:
+            raise ValidationError('Selected student no longer exists.')
+    
+    def validate_subject_id(self, field):
+        if db.session.query(Subject.id).filter_by(id=field.data, is_active=True).first() is None:
+            raise ValidationError('Selected subject no longer exists.')
     
     def validate_marks_obtained(self, field):
         if field.data > self.total_marks.data:
@@ -0,0 +1,261 @@
+import os
+import re
+import time
+import hashlib
+import logging
+import tempfile
+import mimetypes
+from datetime import datetime
+from urllib.parse import quote
+from flask import current_app, url_for, request, abort
+from werkzeug.security import safe_join
+from werkzeug.utils import send_from_directory
+from sqlalchemy import select, update
+from PIL import Image, ImageOps
+from app import db
+from models import Student
+from results_cache import invalidate_result_pages
+
+PHOTO_OPERATION = 'photo_derivatives'
+# Square edge lengths in pixels; pages pick one through srcset
+PHOTO_SIZES = (64, 128, 320)
+# extension -> (Pillow format, save options); neither carries over EXIF
+PHOTO_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True})
+}
+DERIVATIVE_SUBFOLDER = 'derivatives'
+# Unreferenced files younger than this may belong to an upload whose student is not committed yet
+ORPHAN_MIN_AGE = 3600  # seconds
+_EXTENSION_ALIASES = {'jpeg': 'jpg'}
+# Uploads stored by store_photo and their derivatives; their content never changes
+_CONTENT_ADDRESSED = re.compile(rf'^(?:{DERIVATIVE_SUBFOLDER}/)?[0-9a-f]{{64}}(?:_\d+)?\.[a-z]+$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600  # seconds
+
+def is_content_addressed(filename):
+    return bool(_CONTENT_ADDRESSED.match(filename))
+
+def upload_response(filename):
+    """Serve a file from UPLOAD_FOLDER, or hand it to the front proxy per UPLOAD_OFFLOAD.
+
+    Content-addressed files are cacheable for a year without revalidation;
+    older roll-number names may be overwritten and are revalidated each
+    time. Conditional and Range requests are answered by Werkzeug, or by
+    the proxy when it serves the bytes.
+    """
+    folder = os.path.join(current_app.root_path, current_app.config['UPLOAD_FOLDER'])
+    offload = current_app.config.get('UPLOAD_OFFLOAD')
+    immutable = is_content_addressed(filename)
+
+    if offload == 'x-accel-redirect':
+        path = safe_join(folder, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        response = current_app.response_class(
+            mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        )
+        response.headers['X-Accel-Redirect'] = current_app.config['UPLOAD_ACCEL_PREFIX'].rstrip('/') + '/' + quote(filename)
+        if not immutable:
+            response.cache_control.no_cache = True
+    else:
+        response = send_from_directory(
+            folder, filename, request.environ,
+            use_x_sendfile=offload == 'x-sendfile',
+            max_age=IMMUTABLE_MAX_AGE if immutable else None
+        )
+
+    if immutable:
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+def store_photo(file):
+    """Save an uploaded photo under the SHA-256 of its content; returns (filename, path).
+
+    Identical uploads share one file, so a stored file never changes and is
+    only removed by collect_orphan_photos once no student refers to it.
+    """
+    folder = current_app.config['UPLOAD_FOLDER']
+    extension = file.filename.rsplit('.', 1)[1].lower()
+    extension = _EXTENSION_ALIASES.get(extension, extension)
+
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in iter(lambda: file.stream.read(64 * 1024), b''):
+                digest.update(chunk)
+                f.write(chunk)
+        filename = f"{digest.hexdigest()}.{extension}"
+        path = os.path.join(folder, filename)
+        if os.path.exists(path):
+            # Refresh the mtime so a concurrent garbage collection treats it as new
+            os.utime(path)
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return filename, path
+
+def derivative_name(filename, size, extension):
+    """Path of one derivative relative to UPLOAD_FOLDER"""
+    stem = filename.rsplit('.', 1)[0]
+    return f"{DERIVATIVE_SUBFOLDER}/{stem}_{size}.{extension}"
+
+def _derivative_path(filename, size, extension):
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], derivative_name(filename, size, extension))
+
+def derivative_sizes(filename):
+    """Sizes rendered for a photo, smallest first; those larger than the photo itself are skipped"""
+    if not filename:
+        return ()
+    # Sizes are written smallest first and each JPEG after its WebP, so the
+    # largest JPEG there is means every smaller size is there in both formats
+    for count in range(len(PHOTO_SIZES), 0, -1):
+        if os.path.exists(_derivative_path(filename, PHOTO_SIZES[count - 1], 'jpg')):
+            return PHOTO_SIZES[:count]
+    return ()
+
+def derivatives_ready(filename):
+    return bool(derivative_sizes(filename))
+
+def photo_srcset(filename, extension):
+    """srcset of every derivative in one format, or '' until the worker has made them"""
+    return ', '.join(
+        f"{url_for('uploaded_file', filename=derivative_name(filename, size, extension))} {size}w"
+        for size in derivative_sizes(filename)
+    )
+
+def photo_url(filename, size=PHOTO_SIZES[0]):
+    """Smallest JPEG derivative at least size pixels wide, falling back to the original upload"""
+    sizes = derivative_sizes(filename)
+    if not sizes:
+        return url_for('uploaded_file', filename=filename)
+    size = next((candidate for candidate in sizes if candidate >= size), sizes[-1])
+    return url_for('uploaded_file', filename=derivative_name(filename, size, 'jpg'))
+
+def render_derivatives(source_path, filename):
+    """Decode source_path once and write every size the photo can fill in every format.
+
+    Sizes larger than the cropped photo are skipped rather than written at
+    the photo's own size, so a srcset width always matches the file. A photo
+    smaller than every size gets no derivatives and is served as uploaded.
+    """
+    with Image.open(source_path) as original:
+        # Large JPEGs are decoded at a reduced scale, still no smaller than the largest size
+        original.draft('RGB', (PHOTO_SIZES[-1], PHOTO_SIZES[-1]))
+        # Apply the EXIF orientation before the metadata is dropped
+        image = ImageOps.exif_transpose(original)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        else:
+            image = image.convert('RGB')
+    edge = min(image.size)
+    image = ImageOps.fit(image, (edge, edge))
+
+    os.makedirs(os.path.join(current_app.config['UPLOAD_FOLDER'], DERIVATIVE_SUBFOLDER), exist_ok=True)
+    for size in PHOTO_SIZES:
+        if size > edge:
+            break
+        resized = image.resize((size, size), Image.LANCZOS) if edge > size else image
+        for extension, (image_format, options) in PHOTO_FORMATS.items():
+            path = _derivative_path(filename, size, extension)
+            tmp_path = f"{path}.tmp"
+            resized.save(tmp_path, image_format, **options)
+            os.replace(tmp_path, path)
+
+def collect_orphan_photos(min_age=ORPHAN_MIN_AGE, dry_run=False, include_inactive=False):
+    """Delete uploads and derivatives that no student refers to; returns (files, bytes).
+
+    Deactivated students keep their photo so it is still there if they are
+    reactivated. With include_inactive, photos only they refer to are removed
+    too, and those students' references are cleared first.
+    """
+    folder = current_app.config['UPLOAD_FOLDER']
+    query = db.session.query(Student.image_filename).filter(Student.image_filename.isnot(None))
+    if include_inactive:
+        query = query.filter(Student.is_active == True)
+    referenced = {filename for (filename,) in query.distinct()}
+    referenced_stems = {filename.rsplit('.', 1)[0] for filename in referenced}
+    cutoff = time.time() - min_age
+
+    orphans = []
+    for entry in os.scandir(folder):
+        if entry.is_file() and not entry.name.startswith('.') and entry.name not in referenced:
+            orphans.append(entry)
+    derivative_folder = os.path.join(folder, DERIVATIVE_SUBFOLDER)
+    if os.path.isdir(derivative_folder):
+        for entry in os.scandir(derivative_folder):
+            # <stem>_<size>.<extension>, or a .tmp left behind by a crashed worker
+            stem = entry.name.rsplit('.', 1)[0].rsplit('_', 1)[0]
+            if entry.is_file() and (entry.name.endswith('.tmp') or stem not in referenced_stems):
+                orphans.append(entry)
+
+    expired = []
+    for entry in orphans:
+        stat = entry.stat()
+        if stat.st_mtime <= cutoff:
+            expired.append((entry, stat.st_size))
+
+    if include_inactive and not dry_run:
+        # Clear the references before the files go, so a crash in between leaves only orphans
+        uploads = [entry.name for entry, _ in expired if os.path.dirname(entry.path) == folder]
+        for start in range(0, len(uploads), 500):
+            db.session.execute(
+                update(Student)
+                .where(Student.is_active == False, Student.image_filename.in_(uploads[start:start + 500]))
+                .values(image_filename=None, updated_at=datetime.utcnow())
+            )
+        db.session.commit()
+
+    files = freed = 0
+    for entry, size in expired:
+        if not dry_run:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+        files += 1
+        freed += size
+    return files, freed
+
+def run_photo_job(bulk_op):
+    """Worker entry point for a newly uploaded student photo"""
+    bulk_op.total_records = 1
+    if os.path.exists(bulk_op.source_file):
+        filename = os.path.basename(bulk_op.source_file)
+        render_derivatives(bulk_op.source_file, filename)
+        bulk_op.processed_records = 1
+        # Cached result pages still point at the original upload
+        invalidate_result_pages(db.session, roll_nos=db.session.execute(
+            select(Student.roll_no).where(Student.image_filename == filename)
+        ).scalars().all())
+    else:
+        # Replaced or removed before the worker got to it
+        logging.info(f"Photo {bulk_op.source_file} no longer exists; nothing to resize")
+    bulk_op.status = 'completed'
+    bulk_op.completed_at = datetime.utcnow()
+    db.session.commit()
+
+def backfill_derivatives(force=False):
+    """Render derivatives for stored photos that lack them; returns (rendered, failed)"""
+    rendered = failed = 0
+    filenames = db.session.query(Student.image_filename).filter(Student.image_filename.isnot(None)).all()
+    for (filename,) in filenames:
+        if derivatives_ready(filename) and not force:
+            continue
+        source_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+        try:
+            render_derivatives(source_path, filename)
+            rendered += 1
+        except (OSError, Image.DecompressionBombError):
+            logging.exception(f"Could not resize photo {filename}")
+            failed += 1
+    return rendered, failed
@@ -0,0 +1,340 @@
+import io
+import csv
+import bisect
+from datetime import datetime
+from sqlalchemy import select, insert, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app import db
+from models import Student, Subject, Mark
+from summaries import mark_students_dirty
+from facets import invalidate_facets
+from results_cache import invalidate_result_pages
+from rollups import add_to_rollups, lock_rollup_buckets, mark_increment, month_key
+from utils import chunked
+
+# Records written and committed together; bounds memory regardless of file size
+CHUNK_SIZE = 500
+# Only the first errors are kept verbatim; the rest are just counted
+MAX_LOGGED_ERRORS = 1000
+
+class ImportProgress:
+    """Running counters for one import, flushed to its BulkOperation per chunk"""
+
+    def __init__(self, bulk_op):
+        self.bulk_op = bulk_op
+        self.processed = 0
+        self.failed = 0
+        self.errors = []
+        # (line_number, message) since the last flush, in line order: a chunk's
+        # parse errors are recorded while it is read, before the write errors
+        # of its earlier lines
+        self.pending = []
+
+    def error(self, message, line_number):
+        self.failed += 1
+        room = MAX_LOGGED_ERRORS - len(self.errors)
+        if len(self.pending) < room or (self.pending and line_number < self.pending[-1][0]):
+            bisect.insort(self.pending, (line_number, message))
+            del self.pending[room:]
+
+    def _log_pending(self):
+        self.errors.extend(message for _, message in self.pending)
+        self.pending = []
+
+    def error_log(self):
+        self._log_pending()
+        if not self.failed:
+            return None
+        log = '\n'.join(self.errors)
+        if self.failed > len(self.errors):
+            log += f"\n... {self.failed - len(self.errors)} more errors not shown"
+        return log
+
+    def checkpoint(self):
+        return self.processed, self.failed, list(self.pending)
+
+    def restore(self, checkpoint):
+        self.processed, self.failed, self.pending = checkpoint
+
+    def flush(self):
+        self._log_pending()
+        self.bulk_op.processed_records = self.processed
+        self.bulk_op.failed_records = self.failed
+        db.session.commit()
+
+def iter_csv_rows(binary_stream, skip_header):
+    """Yield (line_number, row) pairs from a CSV byte stream without buffering it.
+
+    TextIOWrapper decodes incrementally in fixed-size blocks, so only the
+    current row is ever held in memory.
+    """
+    reader = csv.reader(io.TextIOWrapper(binary_stream, encoding='utf-8', newline=''))
+    if skip_header:
+        next(reader, None)  # Skip header row
+    yield from enumerate(reader, start=2 if skip_header else 1)
+
+def count_csv_rows(path, skip_header):
+    """Cheap pre-pass so the status API can report a meaningful total"""
+    with open(path, 'rb') as f:
+        total = sum(1 for _ in iter_csv_rows(f, skip_header=False))
+    return max(total - 1, 0) if skip_header else total
+
+def parse_student_row(row):
+    """Validate one student CSV row; raises ValueError with a user-facing message"""
+    if len(row) < 2:  # At least roll_no and name required
+        raise ValueError("Insufficient data")
+
+    roll_no = row[0].strip()
+    dob = None
+    if len(row) > 4 and row[4].strip():
+        try:
+            dob = datetime.strptime(row[4].strip(), '%Y-%m-%d').date()
+        except ValueError:
+            raise ValueError(f"Invalid date format for {roll_no}")
+
+    return {
+        'roll_no': roll_no,
+        'name': row[1].strip(),
+        'email': row[2].strip() if len(row) > 2 and row[2].strip() else None,
+        'phone': row[3].strip() if len(row) > 3 and row[3].strip() else None,
+        'date_of_birth': dob,
+        'department': row[5].strip() if len(row) > 5 and row[5].strip() else None,
+        'semester': int(row[6]) if len(row) > 6 and row[6].strip().isdigit() else None,
+        'admission_year': int(row[7]) if len(row) > 7 and row[7].strip().isdigit() else None,
+        'address': row[8].strip() if len(row) > 8 and row[8].strip() else None
+    }
+
+def parse_mark_row(row):
+    """Validate one marks CSV row; raises ValueError with a user-facing message"""
+    if len(row) < 4:  # At least roll_no, subject_code, marks_obtained, total_marks required
+        raise ValueError("Insufficient data")
+
+    exam_date = None
+    if len(row) > 5 and row[5].strip():
+        try:
+            exam_date = datetime.strptime(row[5].strip(), '%Y-%m-%d').date()
+        except ValueError:
+            raise ValueError("Invalid date format")
+
+    return {
+        'roll_no': row[0].strip(),
+        'subject_code': row[1].strip(),
+        'marks_obtained': float(row[2]),
+        'total_marks': float(row[3]),
+        'exam_type': row[4].strip() if len(row) > 4 and row[4].strip() else 'Final',
+        'exam_date': exam_date
+    }
+
+def iter_valid_records(rows, parse, progress):
+    """Parse rows lazily, recording invalid ones on progress and skipping them"""
+    for line_number, row in rows:
+        try:
+            yield line_number, parse(row)
+        except Exception as e:
+            progress.error(f"Line {line_number}: {str(e)}", line_number)
+
+def write_students(chunk, progress, lookups):
+    """Insert a chunk of students with one lookup per unique column and one executemany"""
+    roll_nos = {record['roll_no'] for _, record in chunk}
+    emails = {record['email'] for _, record in chunk if record['email']}
+
+    # Earlier chunks are already committed, so these also catch repeats across the file
+    taken_roll_nos = set(db.session.execute(
+        select(Student.roll_no).where(Student.roll_no.in_(roll_nos))
+    ).scalars())
+    taken_emails = set(db.session.execute(
+        select(Student.email).where(Student.email.in_(emails))
+    ).scalars()) if emails else set()
+
+    rows = []
+    for line_number, record in chunk:
+        if record['roll_no'] in taken_roll_nos:
+            progress.error(f"Line {line_number}: Student with roll number {record['roll_no']} already exists",
+                           line_number)
+            continue
+        if record['email'] and record['email'] in taken_emails:
+            progress.error(f"Line {line_number}: Email {record['email']} already registered", line_number)
+            continue
+        # Later rows in the same chunk with the same keys are duplicates within the file
+        taken_roll_nos.add(record['roll_no'])
+        if record['email']:
+            taken_emails.add(record['email'])
+        rows.append(record)
+
+    if rows:
+        db.session.execute(insert(Student), rows)
+        invalidate_facets(db.session)
+    progress.processed += len(rows)
+
+def prepare_marks_import():
+    """Resolve roll numbers and subject codes to ids once for the whole import"""
+    return {
+        'students': dict(db.session.execute(select(Student.roll_no, Student.id)).all()),
+        'subjects': dict(db.session.execute(select(Subject.code, Subject.id)).all())
+    }
+
+def upsert_marks_statement():
+    """INSERT ... ON CONFLICT DO UPDATE against unique_student_subject_exam, or None where unsupported"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        stmt = postgresql_insert(Mark)
+        conflict_target = {'constraint': 'unique_student_subject_exam'}
+    elif dialect == 'sqlite':
+        # SQLite cannot name a constraint here, only its columns
+        stmt = sqlite_insert(Mark)
+        conflict_target = {'index_elements': ['student_id', 'subject_id', 'exam_type']}
+    else:
+        return None
+
+    return stmt.on_conflict_do_update(
+        **conflict_target,
+        set_={
+            'marks_obtained': stmt.excluded.marks_obtained,
+            'total_marks': stmt.excluded.total_marks,
+            'exam_date': stmt.excluded.exam_date,
+            'updated_at': stmt.excluded.updated_at
+        }
+    )
+
+def marks_rollup_increments(rows, student_ids):
+    """Rollup changes from upserting rows: the marks they replace out, the new values in.
+
+    Read before the upsert under the rollup locks of every bucket the rows
+    can land in, so only this chunk's rows are counted rather than every
+    mark in their buckets. A concurrent import of the same new mark waits
+    for this one to commit and then sees it as a mark it replaces.
+    """
+    connection = db.session.connection()
+    candidates = (Mark.student_id.in_(student_ids), Mark.subject_id.in_({row['subject_id'] for row in rows.values()}))
+    buckets = {(row['subject_id'], month_key(row['created_at'])) for row in rows.values()}
+    buckets.update((subject_id, month_key(created_at)) for subject_id, created_at in connection.execute(
+        select(Mark.subject_id, Mark.created_at).where(*candidates)
+    ))
+    lock_rollup_buckets(connection, buckets)
+
+    students = {student_id: (department, is_active) for student_id, department, is_active in connection.execute(
+        select(Student.id, Student.department, Student.is_active).where(Student.id.in_(student_ids))
+    )}
+    replaced = connection.execute(
+        select(Mark.student_id, Mark.subject_id, Mark.exam_type, Mark.marks_obtained, Mark.created_at)
+        .where(*candidates).with_for_update()
+    ).all()
+
+    increments = []
+    created = {}
+    for student_id, subject_id, exam_type, marks_obtained, created_at in replaced:
+        if (student_id, subject_id, exam_type) in rows and student_id in students:
+            created[(student_id, subject_id, exam_type)] = created_at
+            increments.append(mark_increment(created_at, subject_id, *students[student_id], exam_type,
+                                             marks_obtained, sign=-1))
+    for key, row in rows.items():
+        if row['student_id'] not in students:
+            continue  # Removed since the import started; the rollups only count marks of existing students
+        # The upsert keeps an existing mark's created_at, and with it its month
+        increments.append(mark_increment(created.get(key, row['created_at']), row['subject_id'],
+                                         *students[row['student_id']], row['exam_type'], row['marks_obtained']))
+    return increments
+
+def write_marks_without_upsert(rows):
+    """Update the marks that exist and insert the rest, for databases without ON CONFLICT"""
+    existing = {(student_id, subject_id, exam_type): mark_id
+                for mark_id, student_id, subject_id, exam_type in db.session.execute(
+        select(Mark.id, Mark.student_id, Mark.subject_id, Mark.exam_type).where(
+            Mark.student_id.in_({row['student_id'] for row in rows.values()}),
+            Mark.subject_id.in_({row['subject_id'] for row in rows.values()})
+        )
+    )}
+    updates = [{'id': existing[key], 'marks_obtained': row['marks_obtained'], 'total_marks': row['total_marks'],
+                'exam_date': row['exam_date'], 'updated_at': row['updated_at']}
+               for key, row in rows.items() if key in existing]
+    if updates:
+        db.session.execute(update(Mark), updates)
+    inserts = [row for key, row in rows.items() if key not in existing]
+    if inserts:
+        db.session.execute(insert(Mark), inserts)
+
+def write_marks(chunk, progress, lookups):
+    """Upsert a chunk of marks in a single statement"""
+    now = datetime.utcnow()
+    rows = {}
+    for line_number, record in chunk:
+        student_id = lookups['students'].get(record['roll_no'])
+        if student_id is None:
+            progress.error(f"Line {line_number}: Student {record['roll_no']} not found", line_number)
+            continue
+
+        subject_id = lookups['subjects'].get(record['subject_code'])
+        if subject_id is None:
+            progress.error(f"Line {line_number}: Subject {record['subject_code']} not found", line_number)
+            continue
+
+        # PostgreSQL rejects one statement touching the same row twice; the
+        # later line wins, as it would have when rows were applied one by one
+        rows[(student_id, subject_id, record['exam_type'])] = {
+            'student_id': student_id,
+            'subject_id': subject_id,
+            'marks_obtained': record['marks_obtained'],
+            'total_marks': record['total_marks'],
+            'exam_type': record['exam_type'],
+            'exam_date': record['exam_date'],
+            'created_at': now,
+            'updated_at': now
+        }
+        progress.processed += 1
+
+    if rows:
+        student_ids = {row['student_id'] for row in rows.values()}
+        increments = marks_rollup_increments(rows, student_ids)
+        upsert = upsert_marks_statement()
+        if upsert is not None:
+            db.session.execute(upsert, list(rows.values()))
+        else:
+            write_marks_without_upsert(rows)
+        # Core writes bypass the ORM hooks, so queue the summary refresh explicitly
+        mark_students_dirty(db.session, student_ids)
+        invalidate_result_pages(db.session, student_ids)
+        add_to_rollups(db.session, increments)
+
+def prepare_students_import():
+    return None
+
+# operation_type -> (row parser, one-off lookup loader, chunk writer)
+IMPORTERS = {
+    'import_students': (parse_student_row, prepare_students_import, write_students),
+    'import_marks': (parse_mark_row, prepare_marks_import, write_marks),
+}
+
+def run_import(bulk_op, path, skip_header, chunk_size=CHUNK_SIZE):
+    """Stream a queued CSV import chunk by chunk, recording the outcome on bulk_op"""
+    parse, prepare, write = IMPORTERS[bulk_op.operation_type]
+    progress = ImportProgress(bulk_op)
+    lookups = prepare()
+
+    bulk_op.total_records = count_csv_rows(path, skip_header)
+    db.session.commit()
+
+    with open(path, 'rb') as f:
+        records = iter_valid_records(iter_csv_rows(f, skip_header), parse, progress)
+        for chunk in chunked(records, chunk_size):
+            checkpoint = progress.checkpoint()
+            try:
+                write(chunk, progress, lookups)
+                progress.flush()
+            except Exception as e:
+                # One bad chunk (e.g. a constraint violation) fails only its own rows
+                db.session.rollback()
+                progress.restore(checkpoint)
+                progress.error(f"Lines {chunk[0][0]}-{chunk[-1][0]}: {str(e)}", chunk[0][0])
+                progress.failed += len(chunk) - 1
+                progress.flush()
+
+    bulk_op.total_records = progress.processed + progress.failed
+    bulk_op.processed_records = progress.processed
+    bulk_op.failed_records = progress.failed
+    bulk_op.status = 'completed'
+    bulk_op.completed_at = datetime.utcnow()
+    bulk_op.error_log = progress.error_log()
+    db.session.commit()
+
+    return progress
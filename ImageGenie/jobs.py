@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import uuid
+import logging
+import multiprocessing
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import update
+from app import db
+from models import BulkOperation
+from importers import run_import, IMPORTERS
+from reports import run_report_job
+from images import PHOTO_OPERATION, run_photo_job
+
+def enqueue_import(operation_type, file, user_id, options=None):
+    """Save an uploaded CSV and queue it as a pending BulkOperation"""
+    folder = current_app.config['IMPORT_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"{uuid.uuid4().hex}.csv")
+    file.save(path)
+
+    bulk_op = BulkOperation(
+        operation_type=operation_type,
+        status='pending',
+        user_id=user_id,
+        source_file=path,
+        options=json.dumps(options or {})
+    )
+    db.session.add(bulk_op)
+    db.session.commit()
+    return bulk_op
+
+def enqueue_report(user_id):
+    """Queue a PDF results report for the worker to render"""
+    bulk_op = BulkOperation(
+        operation_type='export_pdf',
+        status='pending',
+        user_id=user_id,
+        options=json.dumps({})
+    )
+    db.session.add(bulk_op)
+    db.session.commit()
+    return bulk_op
+
+def enqueue_photo(path, user_id):
+    """Queue resizing of a saved student photo into its derivatives"""
+    bulk_op = BulkOperation(
+        operation_type=PHOTO_OPERATION,
+        status='pending',
+        user_id=user_id,
+        source_file=path,
+        options=json.dumps({})
+    )
+    db.session.add(bulk_op)
+    return bulk_op
+
+def _run_import_job(bulk_op):
+    options = json.loads(bulk_op.options or '{}')
+    try:
+        run_import(bulk_op, bulk_op.source_file, options.get('skip_header', False))
+    finally:
+        # A failed chunk can leave the transaction unusable; committing it would mask the real error
+        db.session.rollback()
+        if bulk_op.source_file and os.path.exists(bulk_op.source_file):
+            os.remove(bulk_op.source_file)
+            bulk_op.source_file = None
+            db.session.commit()
+
+# operation_type -> handler run by the worker
+JOB_HANDLERS = dict.fromkeys(IMPORTERS, _run_import_job)
+JOB_HANDLERS['export_pdf'] = run_report_job
+JOB_HANDLERS[PHOTO_OPERATION] = run_photo_job
+
+def requeue_stale_jobs(timeout=None):
+    """Return operations stuck in processing for longer than JOB_TIMEOUT to the queue.
+
+    A worker that crashed or was killed never finishes its job. Imports and
+    reports are safe to run again from the start: marks are upserted and
+    students already inserted are reported as duplicates.
+    """
+    if timeout is None:
+        timeout = current_app.config['JOB_TIMEOUT']
+    requeued = db.session.execute(
+        update(BulkOperation)
+        .where(BulkOperation.status == 'processing',
+               BulkOperation.started_at < datetime.utcnow() - timedelta(seconds=timeout))
+        .values(status='pending', started_at=None)
+    ).rowcount
+    db.session.commit()
+    if requeued:
+        logging.warning(f"Requeued {requeued} bulk operation(s) processing for over {timeout}s")
+    return requeued
+
+def claim_next_job():
+    """Atomically move the oldest pending operation to processing.
+
+    The conditional UPDATE means two workers racing for the same row cannot
+    both win, on SQLite and PostgreSQL alike.
+    """
+    requeue_stale_jobs()
+    while True:
+        job_id = db.session.query(BulkOperation.id).filter(
+            BulkOperation.status == 'pending',
+            BulkOperation.operation_type.in_(list(JOB_HANDLERS))
+        ).order_by(BulkOperation.created_at, BulkOperation.id).limit(1).scalar()
+        if job_id is None:
+            db.session.rollback()
+            return None
+
+        claimed = db.session.execute(
+            update(BulkOperation)
+            .where(BulkOperation.id == job_id, BulkOperation.status == 'pending')
+            .values(status='processing', started_at=datetime.utcnow())
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(BulkOperation, job_id)
+
+def run_job(bulk_op):
+    """Execute a claimed operation; failures are recorded on the row"""
+    try:
+        JOB_HANDLERS[bulk_op.operation_type](bulk_op)
+    except Exception as e:
+        logging.exception(f"Bulk operation {bulk_op.id} failed")
+        db.session.rollback()
+        bulk_op.status = 'failed'
+        bulk_op.completed_at = datetime.utcnow()
+        bulk_op.error_log = str(e)
+        db.session.commit()
+
+def work(poll_interval=2.0, once=False):
+    """Process queued operations until interrupted (or the queue drains, with once)"""
+    while True:
+        bulk_op = claim_next_job()
+        if bulk_op is None:
+            if once:
+                return
+            time.sleep(poll_interval)
+            continue
+        logging.info(f"Processing bulk operation {bulk_op.id} ({bulk_op.operation_type})")
+        run_job(bulk_op)
+        db.session.remove()
+
+def _worker_process(poll_interval):
+    # Each process builds (or, when forked, inherits) the app but must not share
+    # pooled connections with its parent
+    from app import app
+    with app.app_context():
+        db.engine.dispose(close=False)
+        try:
+            work(poll_interval)
+        except KeyboardInterrupt:
+            pass
+
+def run_worker_pool(processes, poll_interval=2.0):
+    """Run several worker processes so queued jobs proceed in parallel"""
+    if processes <= 1:
+        work(poll_interval)
+        return
+
+    # Not daemonic: report jobs start their own pool of renderer processes
+    workers = [multiprocessing.Process(target=_worker_process, args=(poll_interval,))
+               for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join()
@@ -0,0 +1,221 @@
+import threading
+from bisect import bisect_left
+from time import perf_counter
+from flask import g, request, has_request_context, Response, jsonify, abort
+from sqlalchemy import event, text
+from sqlalchemy.pool import QueuePool
+
+# Upper bounds (seconds) for the latency histograms
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
+
+# Queries issued outside a request (CLI commands, background workers)
+BACKGROUND_ENDPOINT = 'background'
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus exposition layout"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, self.counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{_labels(labels, le=_format(bound))} {cumulative}')
+        lines.append(f'{name}_bucket{_labels(labels, le="+Inf")} {self.count}')
+        lines.append(f'{name}_sum{_labels(labels)} {_format(self.sum)}')
+        lines.append(f'{name}_count{_labels(labels)} {self.count}')
+        return lines
+
+class MetricsRegistry:
+    """Per-process counters and histograms, keyed by label tuples"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.histograms = {}
+            self.help = {}
+
+    def inc(self, name, labels=(), value=1, help_text=None):
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + value
+            if help_text:
+                self.help.setdefault(name, ('counter', help_text))
+
+    def observe(self, name, value, labels=(), buckets=LATENCY_BUCKETS, help_text=None):
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(labels)
+            if histogram is None:
+                histogram = series[labels] = Histogram(buckets)
+            histogram.observe(value)
+            if help_text:
+                self.help.setdefault(name, ('histogram', help_text))
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                lines.extend(self._header(name, 'counter'))
+                for labels, value in sorted(series.items()):
+                    lines.append(f'{name}{_labels(labels)} {_format(value)}')
+            for name, series in sorted(self.histograms.items()):
+                lines.extend(self._header(name, 'histogram'))
+                for labels, histogram in sorted(series.items()):
+                    lines.extend(histogram.render(name, labels))
+        return '\n'.join(lines) + '\n'
+
+    def _header(self, name, kind):
+        kind, help_text = self.help.get(name, (kind, None))
+        header = [f'# HELP {name} {help_text}'] if help_text else []
+        header.append(f'# TYPE {name} {kind}')
+        return header
+
+registry = MetricsRegistry()
+
+def _format(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+def current_endpoint():
+    if not has_request_context():
+        return BACKGROUND_ENDPOINT
+    # Unmatched URLs share one label so 404 scans cannot explode cardinality
+    return request.url_rule.endpoint if request.url_rule else 'unmatched'
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long callers wait to check out a connection"""
+
+    def _do_get(self):
+        start = perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            registry.observe('db_pool_checkout_wait_seconds', perf_counter() - start,
+                             (('endpoint', current_endpoint()),),
+                             help_text='Time spent waiting for a pooled connection.')
+
+def pool_status(engine):
+    """Pool occupancy for the readiness probe"""
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {'pool': type(pool).__name__, 'saturated': False}
+    capacity = pool.size() + max(pool._max_overflow, 0)
+    checked_out = pool.checkedout()
+    return {
+        'pool': type(pool).__name__,
+        'size': pool.size(),
+        'checked_out': checked_out,
+        'overflow': pool.overflow(),
+        'capacity': capacity,
+        'saturation': round(checked_out / capacity, 3) if capacity else 0,
+        'saturated': pool._max_overflow >= 0 and checked_out >= capacity
+    }
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = perf_counter() - conn.info['query_start'].pop()
+    if has_request_context():
+        g.metrics_queries = g.get('metrics_queries', 0) + 1
+        g.metrics_db_time = g.get('metrics_db_time', 0.0) + elapsed
+    else:
+        labels = (('endpoint', BACKGROUND_ENDPOINT),)
+        registry.inc('db_queries_total', labels, help_text='SQL statements executed.')
+        registry.inc('db_query_seconds_total', labels, elapsed, help_text='Time spent executing SQL.')
+
+def _handle_db_error(exception_context):
+    # Keep the start-time stack balanced when a statement fails
+    stack = exception_context.connection.info.get('query_start') if exception_context.connection else None
+    if stack:
+        stack.pop()
+
+def init_metrics(app, engine):
+    """Attach SQL and request instrumentation and register /metrics and /readyz"""
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_db_error)
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_start = perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        endpoint = current_endpoint()
+        labels = (('endpoint', endpoint),)
+        queries = g.get('metrics_queries', 0)
+
+        registry.inc('http_requests_total',
+                     (('endpoint', endpoint), ('method', request.method), ('status', str(response.status_code))),
+                     help_text='HTTP requests handled.')
+        registry.observe('http_request_duration_seconds', perf_counter() - start, labels,
+                         help_text='Request wall time.')
+        registry.observe('http_request_db_queries', queries, labels, buckets=QUERY_COUNT_BUCKETS,
+                         help_text='SQL statements per request.')
+        registry.inc('db_queries_total', labels, queries, help_text='SQL statements executed.')
+        registry.inc('db_query_seconds_total', labels, g.get('metrics_db_time', 0.0),
+                     help_text='Time spent executing SQL.')
+        # Streamed responses have no length up front and are left out
+        if not response.is_streamed and response.content_length is not None:
+            registry.inc('http_response_bytes_total', labels, response.content_length,
+                         help_text='Response body bytes sent.')
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        token = app.config.get('METRICS_TOKEN')
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            abort(403)
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+    @app.route('/readyz')
+    def readyz():
+        status = pool_status(engine)
+        if status['saturated']:
+            # Probing would just queue behind the busy connections
+            status['database'] = 'skipped'
+        else:
+            try:
+                with engine.connect() as connection:
+                    connection.execute(text('SELECT 1'))
+                status['database'] = 'ok'
+            except Exception as e:
+                status['database'] = f'error: {e}'
+        ready = status['database'] == 'ok' and not status['saturated']
+        status['status'] = 'ready' if ready else 'unavailable'
+        return jsonify(status), 200 if ready else 503
+
+def pool_class_for(database_uri):
+    """Use the timed pool unless SQLite is in-memory and needs a static pool"""
+    if database_uri.startswith('sqlite') and (database_uri in ('sqlite://', 'sqlite:///:memory:')
+                                              or 'mode=memory' in database_uri):
+        return None
+    return TimedQueuePool
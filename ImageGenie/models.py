@@ -2,6 +2,22 @@ from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
 
+# Percentage cut-offs shared by every place that turns a score into a letter grade
+GRADE_THRESHOLDS = [
+    (90, 'A+'),
+    (80, 'A'),
+    (70, 'B+'),
+    (60, 'B'),
+    (50, 'C+'),
+    (40, 'C'),
+]
+
+def grade_for_percentage(percentage):
+    for threshold, grade in GRADE_THRESHOLDS:
+        if percentage >= threshold:
+            return grade
+    return 'F'
+
 class User(db.Model):
     __tablename__ = 'users'
     
@@ -37,11 +53,13 @@ class Student(db.Model):
     semester = db.Column(db.Integer, nullable=True)
     admission_year = db.Column(db.Integer, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     is_active = db.Column(db.Boolean, default=True)
     
     # Relationships
     marks = db.relationship('Mark', backref='student', lazy=True, cascade='all, delete-orphan')
+    result_summary = db.relationship('StudentResultSummary', backref='student', uselist=False,
+                                     lazy=True, cascade='all, delete-orphan')
     
     def calculate_total_marks(self):
         return sum(mark.marks_obtained for mark in self.marks if mark.marks_obtained is not None)
@@ -54,25 +72,36 @@ class Student(db.Model):
         return (obtained_marks / total_marks * 100) if total_marks > 0 else 0
     
     def get_grade(self):
-        percentage = self.calculate_percentage()
-        if percentage >= 90:
-            return 'A+'
-        elif percentage >= 80:
-            return 'A'
-        elif percentage >= 70:
-            return 'B+'
-        elif percentage >= 60:
-            return 'B'
-        elif percentage >= 50:
-            return 'C+'
-        elif percentage >= 40:
-            return 'C'
-        else:
-            return 'F'
+        return grade_for_percentage(self.calculate_percentage())
+    
+    @property
+    def summary(self):
+        # Materialized totals; students without marks may not have a row yet
+        return self.result_summary or StudentResultSummary.empty(self.id)
     
     def __repr__(self):
         return f'<Student {self.roll_no}: {self.name}>'
 
+class StudentResultSummary(db.Model):
+    """Denormalized per-student totals, kept in sync by summaries.py"""
+    __tablename__ = 'student_result_summary'
+    
+    student_id = db.Column(db.Integer, db.ForeignKey('students.id'), primary_key=True)
+    total_obtained = db.Column(db.Float, nullable=False, default=0.0)
+    total_possible = db.Column(db.Float, nullable=False, default=0.0)
+    percentage = db.Column(db.Float, nullable=False, default=0.0, index=True)
+    grade = db.Column(db.String(2), nullable=False, default='F', index=True)
+    mark_count = db.Column(db.Integer, nullable=False, default=0)
+    last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    @classmethod
+    def empty(cls, student_id=None):
+        return cls(student_id=student_id, total_obtained=0.0, total_possible=0.0,
+                   percentage=0.0, grade=grade_for_percentage(0), mark_count=0)
+    
+    def __repr__(self):
+        return f'<StudentResultSummary {self.student_id}: {self.percentage:.2f}% {self.grade}>'
+
 class Subject(db.Model):
     __tablename__ = 'subjects'
     
@@ -102,34 +131,41 @@ class Mark(db.Model):
     exam_type = db.Column(db.String(50), default='Final')  # Final, Mid-term, Assignment, etc.
     exam_date = db.Column(db.Date, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # Unique constraint to prevent duplicate entries
-    __table_args__ = (db.UniqueConstraint('student_id', 'subject_id', 'exam_type', name='unique_student_subject_exam'),)
+    # ix_marks_subject_created lets the analytics rollups recompute one subject-month at a time
+    __table_args__ = (db.UniqueConstraint('student_id', 'subject_id', 'exam_type', name='unique_student_subject_exam'),
+                      db.Index('ix_marks_subject_created', 'subject_id', 'created_at'))
     
     def get_percentage(self):
         return (self.marks_obtained / self.total_marks * 100) if self.total_marks > 0 and self.marks_obtained is not None else 0
     
     def get_grade(self):
-        percentage = self.get_percentage()
-        if percentage >= 90:
-            return 'A+'
-        elif percentage >= 80:
-            return 'A'
-        elif percentage >= 70:
-            return 'B+'
-        elif percentage >= 60:
-            return 'B'
-        elif percentage >= 50:
-            return 'C+'
-        elif percentage >= 40:
-            return 'C'
-        else:
-            return 'F'
+        return grade_for_percentage(self.get_percentage())
     
     def __repr__(self):
         return f'<Mark {self.student.roll_no} - {self.subject.code}: {self.marks_obtained}/{self.total_marks}>'
 
+class MarkRollup(db.Model):
+    """Mark counts and sums per department, subject, exam type and month, kept in sync by rollups.py"""
+    __tablename__ = 'mark_rollups'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.String(7), nullable=False)  # YYYY-MM of the mark's created_at
+    subject_id = db.Column(db.Integer, db.ForeignKey('subjects.id'), nullable=False)
+    # '' rather than NULL when missing, so rows without one still conflict in unique_mark_rollup_bucket
+    department = db.Column(db.String(50), nullable=False, default='')  # The student's, at refresh time
+    student_active = db.Column(db.Boolean, nullable=False)
+    exam_type = db.Column(db.String(50), nullable=False, default='')
+    mark_count = db.Column(db.Integer, nullable=False, default=0)
+    scored_count = db.Column(db.Integer, nullable=False, default=0)  # Marks with marks_obtained set
+    marks_sum = db.Column(db.Float, nullable=False, default=0.0)
+    
+    __table_args__ = (db.UniqueConstraint('month', 'subject_id', 'department', 'student_active', 'exam_type',
+                                          name='unique_mark_rollup_bucket'),
+                      db.Index('ix_mark_rollups_subject_month', 'subject_id', 'month'))
+
 class AuditLog(db.Model):
     __tablename__ = 'audit_logs'
     
@@ -140,9 +176,12 @@ class AuditLog(db.Model):
     record_id = db.Column(db.Integer, nullable=True)
     old_values = db.Column(db.Text, nullable=True)
     new_values = db.Column(db.Text, nullable=True)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     ip_address = db.Column(db.String(45), nullable=True)
     
+    # Per-record history reads are a range scan on this index
+    __table_args__ = (db.Index('ix_audit_logs_record_history', 'table_name', 'record_id', 'timestamp'),)
+    
     # Relationships
     user = db.relationship('User', backref='audit_logs')
     
@@ -154,17 +193,44 @@ class BulkOperation(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     operation_type = db.Column(db.String(50), nullable=False)  # import_students, import_marks, etc.
-    status = db.Column(db.String(20), default='pending')  # pending, completed, failed
+    status = db.Column(db.String(20), default='pending', index=True)  # pending, processing, completed, failed
     total_records = db.Column(db.Integer, default=0)
     processed_records = db.Column(db.Integer, default=0)
     failed_records = db.Column(db.Integer, default=0)
     error_log = db.Column(db.Text, nullable=True)
+    source_file = db.Column(db.String(255), nullable=True)  # Uploaded file awaiting a worker
+    options = db.Column(db.Text, nullable=True)  # JSON-encoded import options
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
     completed_at = db.Column(db.DateTime, nullable=True)
     
     # Relationships
     user = db.relationship('User', backref='bulk_operations')
     
+    def to_status_dict(self):
+        return {
+            'id': self.id,
+            'operation_type': self.operation_type,
+            'status': self.status,
+            'total_records': self.total_records or 0,
+            'processed_records': self.processed_records or 0,
+            'failed_records': self.failed_records or 0,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
+    
     def __repr__(self):
         return f'<BulkOperation {self.operation_type}: {self.status}>'
+
+class CacheEntry(db.Model):
+    """Small JSON values shared by every worker process, e.g. filter facets"""
+    __tablename__ = 'cache_entries'
+    
+    key = db.Column(db.String(255), primary_key=True)
+    value = db.Column(db.Text, nullable=False)  # JSON-encoded
+    expires_at = db.Column(db.DateTime, nullable=True, index=True)
+    
+    def __repr__(self):
+        return f'<CacheEntry {self.key}>'
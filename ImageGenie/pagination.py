@@ -0,0 +1,103 @@
+import json
+import time
+import base64
+import binascii
+import threading
+from sqlalchemy import tuple_
+
+# Totals are shown as "about N", so a short-lived cached count is good enough
+COUNT_CACHE_SECONDS = 60
+COUNT_CACHE_SIZE = 256
+
+_count_cache = {}
+_count_cache_lock = threading.Lock()
+
+class KeysetPage:
+    """One page of a keyset-paginated query, with opaque cursors to its neighbours"""
+
+    def __init__(self, items, next_cursor, prev_cursor, total):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+def decode_cursor(token, size):
+    """Cursor values, or None for a missing or malformed token"""
+    if not token:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (binascii.Error, ValueError):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
+
+def _after(keys, values):
+    if len(keys) == 1:
+        return keys[0] > values[0]
+    return tuple_(*keys) > tuple_(*values)
+
+def _before(keys, values):
+    if len(keys) == 1:
+        return keys[0] < values[0]
+    return tuple_(*keys) < tuple_(*values)
+
+def keyset_paginate(query, keys, after=None, before=None, per_page=20, total=None):
+    """Fetch the page following cursor after (or preceding cursor before).
+
+    keys are ascending sort expressions that together identify a row; each
+    page is a range condition on them plus LIMIT, so page depth costs nothing.
+    """
+    query = query.add_columns(*keys)
+    after_values = decode_cursor(after, len(keys))
+    before_values = decode_cursor(before, len(keys)) if after_values is None else None
+
+    if before_values is not None:
+        rows = query.filter(_before(keys, before_values)).order_by(*(key.desc() for key in keys)) \
+            .limit(per_page + 1).all()
+        has_more = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        has_prev, has_next = has_more, True
+    else:
+        if after_values is not None:
+            query = query.filter(_after(keys, after_values))
+        rows = query.order_by(*keys).limit(per_page + 1).all()
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_prev = after_values is not None
+
+    items = [row[0] for row in rows]
+    next_cursor = encode_cursor(list(rows[-1][1:])) if rows and has_next else None
+    prev_cursor = encode_cursor(list(rows[0][1:])) if rows and has_prev else None
+    return KeysetPage(items, next_cursor, prev_cursor, total)
+
+def cached_count(cache_key, query):
+    """COUNT(*) for query, reused for COUNT_CACHE_SECONDS per cache_key"""
+    now = time.monotonic()
+    with _count_cache_lock:
+        entry = _count_cache.get(cache_key)
+        if entry and entry[0] > now:
+            return entry[1]
+
+    count = query.order_by(None).count()
+
+    with _count_cache_lock:
+        if len(_count_cache) >= COUNT_CACHE_SIZE:
+            for key in [key for key, (expires, _) in _count_cache.items() if expires <= now]:
+                del _count_cache[key]
+            while len(_count_cache) >= COUNT_CACHE_SIZE:
+                del _count_cache[next(iter(_count_cache))]
+        _count_cache[cache_key] = (now + COUNT_CACHE_SECONDS, count)
+    return count
@@ -0,0 +1,168 @@
+import os
+import json
+import hmac
+import shutil
+import hashlib
+import secrets
+from datetime import datetime
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app
+from app import db
+from models import Student
+from results_cache import result_query, render_result_page
+
+# Students rendered per task; one query loads a whole chunk
+PUBLISH_CHUNK_SIZE = 500
+# The live release plus the one before it, for a quick rollback
+PUBLISH_KEEP_RELEASES = 2
+CURRENT_LINK = 'current'
+RELEASES_FOLDER = 'releases'
+PUBLIC_FOLDER = 'public'
+
+def _shard(roll_no):
+    # 256 index files, so a lookup reads a few KB instead of the whole roster
+    return hashlib.sha256(roll_no.encode()).hexdigest()[:2]
+
+def dob_hash(roll_no, date_of_birth):
+    """Keyed hash of a date of birth, so the published index does not reveal it"""
+    message = f"{roll_no}:{date_of_birth.isoformat()}".encode()
+    return hmac.new(current_app.secret_key.encode(), message, hashlib.sha256).hexdigest()
+
+def result_document(student):
+    """Compact JSON form of one student's result"""
+    summary = student.summary
+    return {
+        'roll_no': student.roll_no,
+        'name': student.name,
+        'department': student.department,
+        'semester': student.semester,
+        'summary': {
+            'total_obtained': summary.total_obtained,
+            'total_possible': summary.total_possible,
+            'percentage': round(summary.percentage, 2),
+            'grade': summary.grade
+        },
+        'marks': [
+            [mark.subject.code, mark.subject.name, mark.exam_type, mark.marks_obtained, mark.total_marks,
+             mark.get_grade()]
+            for mark in student.marks
+        ]
+    }
+
+def publish_chunk(student_ids, results_folder):
+    """Write the page and document of each student; returns their index entries"""
+    entries = []
+    for student in result_query().filter(Student.id.in_(student_ids)):
+        # Unguessable names: the static server does no date of birth check of its own
+        token = secrets.token_urlsafe(16)
+        with open(os.path.join(results_folder, f"{token}.html"), 'w', encoding='utf-8') as f:
+            f.write(render_result_page(student))
+        with open(os.path.join(results_folder, f"{token}.json"), 'w', encoding='utf-8') as f:
+            json.dump(result_document(student), f, separators=(',', ':'))
+        entries.append((student.roll_no, token,
+                        dob_hash(student.roll_no, student.date_of_birth) if student.date_of_birth else None))
+    db.session.remove()
+    return entries
+
+def _init_publish_process():
+    # Forked or spawned, each renderer needs its own app, request context and connections
+    from app import app
+    app.test_request_context('/').push()
+    db.engine.dispose(close=False)
+
+def _publish_chunk_in_process(args):
+    return publish_chunk(*args)
+
+def publish_results(processes=1):
+    """Render every active student's result into a new release and make it current.
+
+    Returns (students published, release path). The release is built beside
+    the live one and swapped in by replacing the `current` symlink, so a
+    static server never sees a half-written release.
+    """
+    folder = os.path.abspath(current_app.config['PUBLISHED_RESULTS_FOLDER'])
+    release = os.path.join(folder, RELEASES_FOLDER, datetime.utcnow().strftime('%Y%m%d%H%M%S%f'))
+    # Only public/ is served; the index next to it maps roll numbers to the unguessable names
+    results_folder = os.path.join(release, PUBLIC_FOLDER, 'results')
+    os.makedirs(results_folder)
+
+    student_ids = db.session.execute(
+        db.select(Student.id).where(Student.is_active == True).order_by(Student.id)
+    ).scalars().all()
+    db.session.commit()
+    chunks = [(student_ids[start:start + PUBLISH_CHUNK_SIZE], results_folder)
+              for start in range(0, len(student_ids), PUBLISH_CHUNK_SIZE)]
+
+    try:
+        if processes <= 1 or len(chunks) <= 1:
+            with current_app.test_request_context('/'):
+                results = [publish_chunk(*chunk) for chunk in chunks]
+        else:
+            with ProcessPoolExecutor(max_workers=processes, initializer=_init_publish_process) as executor:
+                results = list(executor.map(_publish_chunk_in_process, chunks))
+
+        shards = {}
+        for entries in results:
+            for roll_no, token, hashed_dob in entries:
+                shards.setdefault(_shard(roll_no), {})[roll_no] = [token, hashed_dob]
+        index_folder = os.path.join(release, 'index')
+        os.makedirs(index_folder)
+        for shard, entries in shards.items():
+            with open(os.path.join(index_folder, f"{shard}.json"), 'w', encoding='utf-8') as f:
+                json.dump(entries, f, separators=(',', ':'))
+        count = sum(len(entries) for entries in shards.values())
+        with open(os.path.join(release, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump({'published_at': datetime.utcnow().isoformat(), 'students': count}, f)
+    except BaseException:
+        shutil.rmtree(release, ignore_errors=True)
+        raise
+
+    link = os.path.join(folder, CURRENT_LINK)
+    tmp_link = f"{link}.tmp"
+    if os.path.lexists(tmp_link):
+        os.remove(tmp_link)
+    os.symlink(os.path.relpath(release, folder), tmp_link)
+    os.replace(tmp_link, link)
+
+    _prune_releases(os.path.join(folder, RELEASES_FOLDER))
+    return count, release
+
+def _prune_releases(releases_folder):
+    for name in sorted(os.listdir(releases_folder))[:-PUBLISH_KEEP_RELEASES]:
+        shutil.rmtree(os.path.join(releases_folder, name), ignore_errors=True)
+
+def current_release():
+    """Directory of the live release, or None before the first publish; serve only its public/"""
+    link = os.path.join(current_app.config['PUBLISHED_RESULTS_FOLDER'], CURRENT_LINK)
+    return os.path.realpath(link) if os.path.isdir(link) else None
+
+@lru_cache(maxsize=1024)
+def _load_shard(release, shard):
+    # Keyed by release directory, so a swap is picked up without invalidation
+    try:
+        with open(os.path.join(release, 'index', f"{shard}.json"), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def published_result(roll_no):
+    """(token, hashed date of birth) for roll_no in the live release, or None"""
+    release = current_release()
+    if release is None:
+        return None
+    entry = _load_shard(release, _shard(roll_no)).get(roll_no)
+    return tuple(entry) if entry else None
+
+def find_published_result(roll_no, date_of_birth=None):
+    """(token, None) for a matching published result, else (None, message for the user)"""
+    published = published_result(roll_no)
+    if published is None:
+        return None, 'Student not found!'
+    token, hashed_dob = published
+    if date_of_birth and not (hashed_dob and hmac.compare_digest(hashed_dob, dob_hash(roll_no, date_of_birth))):
+        return None, 'Date of birth does not match our records.'
+    return token, None
+
+def published_url(token, extension='html'):
+    return f"{current_app.config['PUBLISHED_RESULTS_URL'].rstrip('/')}/results/{token}.{extension}"
@@ -0,0 +1,38 @@
+import time
+import math
+import threading
+
+class RateLimiter:
+    """Fixed-window request counter per key (e.g. client IP), kept in this process.
+
+    Needs no database round trip, which is the point when the database is
+    what a refresh storm would overwhelm; each worker process counts on
+    its own, so a client gets at most limit requests per window per worker.
+    """
+
+    def __init__(self, limit, window, max_keys=10000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key):
+        """Count one request for key; returns 0 if allowed, else seconds until it would be"""
+        now = time.monotonic()
+        with self._lock:
+            started, count = self._windows.get(key, (now, 0))
+            if now - started >= self.window:
+                started, count = now, 0
+            if count >= self.limit:
+                return max(math.ceil(started + self.window - now), 1)
+            if key not in self._windows and len(self._windows) >= self.max_keys:
+                self._evict(now)
+            self._windows[key] = (started, count + 1)
+            return 0
+
+    def _evict(self, now):
+        for key in [key for key, (started, _) in self._windows.items() if now - started >= self.window]:
+            del self._windows[key]
+        while len(self._windows) >= self.max_keys:
+            del self._windows[next(iter(self._windows))]
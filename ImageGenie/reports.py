@@ -0,0 +1,201 @@
+import os
+import json
+import shutil
+import tempfile
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from flask import current_app
+from pypdf import PdfWriter
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.platypus import SimpleDocTemplate, LongTable, TableStyle, Paragraph, Spacer, PageBreak
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from sqlalchemy import select, func
+from app import db
+from models import Student, StudentResultSummary, BulkOperation
+from export_cache import data_version, evict_artifacts
+
+# Rows per LongTable; keeps reportlab's split/layout cost linear in the row count
+TABLE_CHUNK_ROWS = 250
+
+HEADER = ['Roll No', 'Name', 'Department', 'Semester', 'Total Marks', 'Percentage', 'Grade']
+
+# Built once and shared by every table chunk
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 8),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+
+def report_path(operation_id):
+    return os.path.join(current_app.config['REPORT_FOLDER'], f"student_results_{operation_id}.pdf")
+
+def report_version(bulk_op):
+    return json.loads(bulk_op.options or '{}').get('data_version')
+
+def report_for_version(version):
+    """Newest PDF export that serves version: finished on disk, running, or still queued"""
+    operations = BulkOperation.query.filter(
+        BulkOperation.operation_type == 'export_pdf',
+        BulkOperation.status.in_(['pending', 'processing', 'completed'])
+    ).order_by(BulkOperation.id.desc()).limit(20)
+
+    for bulk_op in operations:
+        if bulk_op.status == 'pending':
+            return bulk_op  # Reads whatever is current when the worker picks it up
+        if report_version(bulk_op) != version:
+            continue
+        if bulk_op.status == 'processing' or os.path.exists(report_path(bulk_op.id)):
+            return bulk_op
+    return None
+
+def report_sections():
+    """(department, semester) pairs with their active student counts, in report order"""
+    return db.session.execute(
+        select(Student.department, Student.semester, func.count(Student.id))
+        .where(Student.is_active == True)
+        .group_by(Student.department, Student.semester)
+        .order_by(Student.department.is_(None), Student.department,
+                  Student.semester.is_(None), Student.semester)
+    ).all()
+
+def section_rows(department, semester):
+    query = select(
+        Student.roll_no, Student.name, Student.department, Student.semester,
+        func.coalesce(StudentResultSummary.total_obtained, 0.0),
+        func.coalesce(StudentResultSummary.percentage, 0.0),
+        func.coalesce(StudentResultSummary.grade, 'F')
+    ).outerjoin(StudentResultSummary, StudentResultSummary.student_id == Student.id).where(
+        Student.is_active == True,
+        Student.department == department if department is not None else Student.department.is_(None),
+        Student.semester == semester if semester is not None else Student.semester.is_(None)
+    ).order_by(Student.roll_no)
+
+    for roll_no, name, dept, sem, total, percentage, grade in db.session.execute(query):
+        yield [roll_no, name, dept or 'N/A', str(sem) if sem else 'N/A',
+               str(total), f"{percentage:.2f}%", grade]
+
+def _section_title(department, semester):
+    return f"{department or 'No Department'} - {f'Semester {semester}' if semester else 'No Semester'}"
+
+def section_flowables(department, semester, styles):
+    elements = [Paragraph(_section_title(department, semester), styles['Heading2']), Spacer(1, 10)]
+    chunk = []
+    for row in section_rows(department, semester):
+        chunk.append(row)
+        if len(chunk) == TABLE_CHUNK_ROWS:
+            elements.append(_table(chunk))
+            chunk = []
+    if chunk:
+        elements.append(_table(chunk))
+    elements.append(Spacer(1, 20))
+    return elements
+
+def _table(rows):
+    table = LongTable([HEADER] + rows, repeatRows=1)
+    table.setStyle(TABLE_STYLE)
+    return table
+
+def _cover_flowables(styles):
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=16,
+        spaceAfter=30,
+        alignment=1  # Center alignment
+    )
+    return [
+        Paragraph("Student Results Report", title_style),
+        Paragraph(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Normal']),
+        Spacer(1, 20)
+    ]
+
+def render_section(department, semester, path):
+    """Render one department/semester section to its own PDF file"""
+    styles = getSampleStyleSheet()
+    SimpleDocTemplate(path, pagesize=A4).build(section_flowables(department, semester, styles))
+    return path
+
+def _init_section_process():
+    # Forked or spawned, each renderer needs its own app context and connections
+    from app import app
+    app.app_context().push()
+    db.engine.dispose(close=False)
+
+def _render_section_in_process(args):
+    return render_section(*args)
+
+def build_report(path, processes=1, on_section_done=None):
+    """Render every section and write the merged report to path.
+
+    With more than one process, sections are laid out concurrently into
+    separate files and concatenated in order; otherwise a single document is
+    built in-process.
+    """
+    styles = getSampleStyleSheet()
+    sections = report_sections()
+    tmp_path = f"{path}.tmp"
+
+    if processes <= 1 or len(sections) <= 1:
+        elements = _cover_flowables(styles)
+        for department, semester, count in sections:
+            # Each section starts a page, matching the merged multi-process output
+            elements.append(PageBreak())
+            elements.extend(section_flowables(department, semester, styles))
+            if on_section_done:
+                on_section_done(count)
+        SimpleDocTemplate(tmp_path, pagesize=A4).build(elements)
+        os.replace(tmp_path, path)
+        return
+
+    work_dir = tempfile.mkdtemp(prefix='report_', dir=os.path.dirname(path))
+    try:
+        cover_path = os.path.join(work_dir, 'cover.pdf')
+        SimpleDocTemplate(cover_path, pagesize=A4).build(_cover_flowables(styles))
+
+        section_paths = [os.path.join(work_dir, f"section_{i:05d}.pdf") for i in range(len(sections))]
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_section_process) as executor:
+            futures = {
+                executor.submit(_render_section_in_process, (department, semester, section_path)): count
+                for (department, semester, count), section_path in zip(sections, section_paths)
+            }
+            for future in as_completed(futures):
+                future.result()
+                if on_section_done:
+                    on_section_done(futures[future])
+
+        writer = PdfWriter()
+        for part in [cover_path] + section_paths:
+            writer.append(part)
+        with open(tmp_path, 'wb') as f:
+            writer.write(f)
+        os.replace(tmp_path, path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def run_report_job(bulk_op):
+    """Worker entry point for a queued PDF export"""
+    os.makedirs(current_app.config['REPORT_FOLDER'], exist_ok=True)
+    # Taken before reading so a concurrent change can only make the report look stale
+    bulk_op.options = json.dumps({'data_version': data_version()})
+    bulk_op.total_records = Student.query.filter_by(is_active=True).count()
+    db.session.commit()
+
+    def section_done(count):
+        bulk_op.processed_records = (bulk_op.processed_records or 0) + count
+        db.session.commit()
+
+    path = report_path(bulk_op.id)
+    build_report(path, current_app.config['REPORT_PROCESSES'], section_done)
+    evict_artifacts(keep=path)
+
+    bulk_op.status = 'completed'
+    bulk_op.completed_at = datetime.utcnow()
+    db.session.commit()
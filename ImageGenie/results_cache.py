@@ -0,0 +1,74 @@
+from flask import render_template
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, joinedload, selectinload
+from models import Student, Subject, Mark
+from cache import cache_get, cache_set, cache_delete, cache_delete_prefix
+from session_hooks import on_commit
+from utils import chunked
+
+RESULT_PAGE_PREFIX = 'result_page:'
+# Bounds the life of a page rendered from rows a concurrent write was replacing
+RESULT_PAGE_TTL = 300  # seconds
+# Keys per DELETE, well under every backend's bound-parameter limit
+INVALIDATE_BATCH_SIZE = 500
+
+def result_query():
+    """Active students with everything the result page shows loaded up front"""
+    return Student.query.filter_by(is_active=True).options(
+        joinedload(Student.result_summary),
+        selectinload(Student.marks).joinedload(Mark.subject)
+    )
+
+def render_result_page(student):
+    marks_by_exam = {}
+    for mark in student.marks:
+        marks_by_exam.setdefault(mark.exam_type, []).append(mark)
+    return render_template('view_result.html', student=student, summary=student.summary, marks_by_exam=marks_by_exam)
+
+def result_page_key(roll_no):
+    return f"{RESULT_PAGE_PREFIX}{roll_no}"
+
+def cached_result_page(roll_no):
+    """Rendered result page for roll_no as shown to anonymous visitors, or None"""
+    return cache_get(result_page_key(roll_no))
+
+def store_result_page(roll_no, html):
+    cache_set(result_page_key(roll_no), html, ttl=RESULT_PAGE_TTL)
+
+def invalidate_result_pages(session, student_ids=(), roll_nos=(), everything=False):
+    """Drop cached result pages when session commits; for Core writes the ORM hooks cannot see"""
+    on_commit(session, RESULT_PAGE_PREFIX,
+              [('student_id', sid) for sid in student_ids if sid is not None] +
+              [('roll_no', roll_no) for roll_no in roll_nos if roll_no] +
+              ([('everything', True)] if everything else []),
+              _drop_result_pages)
+
+def _drop_result_pages(session, items):
+    targets = {}
+    for kind, value in items:
+        targets.setdefault(kind, set()).add(value)
+    if 'everything' in targets:
+        cache_delete_prefix(RESULT_PAGE_PREFIX, session=session)
+        return
+    roll_nos = targets.get('roll_no', set())
+    for chunk in chunked(targets.get('student_id', ()), INVALIDATE_BATCH_SIZE):
+        roll_nos.update(session.execute(select(Student.roll_no).where(Student.id.in_(chunk))).scalars())
+    for chunk in chunked(roll_nos, INVALIDATE_BATCH_SIZE):
+        cache_delete(*(result_page_key(roll_no) for roll_no in chunk), session=session)
+
+@event.listens_for(Session, 'after_flush')
+def _collect_result_changes(session, flush_context):
+    student_ids, roll_nos, everything = set(), set(), False
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Student):
+            roll_nos.add(obj.roll_no)
+            # A renamed roll number leaves a page behind under the old one
+            roll_nos.update(inspect(obj).attrs.roll_no.history.deleted or ())
+        elif isinstance(obj, Mark):
+            student_ids.add(obj.student_id)
+            student_ids.update(inspect(obj).attrs.student_id.history.deleted or ())
+        elif isinstance(obj, Subject) and obj not in session.new:
+            # Subject names and codes appear on every page with a mark in it
+            everything = True
+    if student_ids or roll_nos or everything:
+        invalidate_result_pages(session, student_ids, roll_nos, everything)
@@ -0,0 +1,270 @@
+from datetime import datetime
+from sqlalchemy import event, func, select, delete, insert, inspect, false
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from app import db
+from models import Student, Subject, Mark, MarkRollup
+from session_hooks import on_commit
+from utils import chunked
+
+# Subjects per refresh statement; keeps IN (...) lists well below SQLite's bound-parameter limit
+ROLLUP_CHUNK_SIZE = 500
+# Student columns that decide which rollup row a mark counts toward
+ROLLUP_STUDENT_COLUMNS = ('department', 'is_active')
+
+def month_key(moment):
+    return moment.strftime('%Y-%m') if moment else None
+
+def _month_range(month):
+    start = datetime.strptime(month, '%Y-%m')
+    end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return start, end
+
+def lock_rollup_buckets(connection, buckets):
+    """Serialise writers of the same (subject_id, month) rows until the transaction ends.
+
+    A recompute reads a bucket's marks and then replaces its rows; an import
+    reads the marks it is about to replace and then adds the difference.
+    Either could miss marks a concurrent transaction is writing, so both
+    take this first. PostgreSQL gets one advisory lock per bucket; SQLite
+    has one write lock for the whole database, taken here so that the reads
+    which follow already hold it.
+    """
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        # pysqlite only begins a transaction at the first write; one that matches nothing will do
+        connection.execute(delete(MarkRollup).where(false()))
+    elif dialect == 'postgresql':
+        # In one order, so two writers never wait on each other's locks
+        for subject_id, month in sorted((subject_id, month) for subject_id, month in buckets
+                                        if subject_id is not None and month is not None):
+            connection.execute(select(func.pg_advisory_xact_lock(subject_id, int(month.replace('-', '')))))
+
+def refresh_rollups(buckets, session=None):
+    """Recompute the rollup rows of the given (subject_id, month) buckets.
+
+    Months are matched as created_at ranges rather than with a dialect's
+    date formatting function, so the same statements run on SQLite and
+    PostgreSQL. Passing None as the subject recomputes the whole month.
+    """
+    session = session or db.session
+    connection = session.connection()
+    by_month = {}
+    for subject_id, month in buckets:
+        if month is not None:
+            by_month.setdefault(month, set()).add(subject_id)
+
+    for month, subject_ids in by_month.items():
+        if None in subject_ids:
+            start, end = _month_range(month)
+            subject_ids.discard(None)
+            subject_ids.update(connection.execute(
+                select(Mark.subject_id).where(Mark.created_at >= start, Mark.created_at < end)
+                .union(select(MarkRollup.subject_id).where(MarkRollup.month == month))
+            ).scalars())
+    lock_rollup_buckets(connection, {(subject_id, month) for month, subject_ids in by_month.items()
+                               for subject_id in subject_ids})
+
+    for month, subject_ids in sorted(by_month.items()):
+        start, end = _month_range(month)
+        for chunk in chunked(sorted(subject_ids), ROLLUP_CHUNK_SIZE):
+            department = func.coalesce(Student.department, '')
+            exam_type = func.coalesce(Mark.exam_type, '')
+            rows = connection.execute(
+                select(
+                    Mark.subject_id, department, Student.is_active, exam_type,
+                    func.count(Mark.id), func.count(Mark.marks_obtained),
+                    func.coalesce(func.sum(Mark.marks_obtained), 0.0)
+                ).join(Student, Student.id == Mark.student_id)
+                .where(Mark.created_at >= start, Mark.created_at < end, Mark.subject_id.in_(chunk))
+                .group_by(Mark.subject_id, department, Student.is_active, exam_type)
+            ).all()
+
+            connection.execute(delete(MarkRollup).where(MarkRollup.month == month, MarkRollup.subject_id.in_(chunk)))
+            if rows:
+                connection.execute(insert(MarkRollup), [{
+                    'month': month,
+                    'subject_id': subject_id,
+                    'department': department,
+                    'student_active': bool(is_active),
+                    'exam_type': exam_type,
+                    'mark_count': mark_count,
+                    'scored_count': scored_count,
+                    'marks_sum': float(marks_sum)
+                } for subject_id, department, is_active, exam_type, mark_count, scored_count, marks_sum in rows])
+
+def mark_increment(created_at, subject_id, department, student_active, exam_type, marks_obtained, sign=1):
+    """One mark's contribution to its rollup row; sign=-1 takes it away again"""
+    return (month_key(created_at), subject_id, department or '', bool(student_active), exam_type or '',
+            sign, sign * (marks_obtained is not None), sign * (marks_obtained or 0.0))
+
+def add_to_rollups_statement(dialect):
+    """INSERT ... ON CONFLICT DO UPDATE adding to the counts of unique_mark_rollup_bucket, or None where unsupported"""
+    if dialect == 'postgresql':
+        stmt = postgresql_insert(MarkRollup)
+        conflict_target = {'constraint': 'unique_mark_rollup_bucket'}
+    elif dialect == 'sqlite':
+        stmt = sqlite_insert(MarkRollup)
+        conflict_target = {'index_elements': ['month', 'subject_id', 'department', 'student_active', 'exam_type']}
+    else:
+        return None
+
+    return stmt.on_conflict_do_update(
+        **conflict_target,
+        set_={
+            'mark_count': MarkRollup.mark_count + stmt.excluded.mark_count,
+            'scored_count': MarkRollup.scored_count + stmt.excluded.scored_count,
+            'marks_sum': MarkRollup.marks_sum + stmt.excluded.marks_sum
+        }
+    )
+
+def apply_rollup_increments(increments, session=None):
+    """Add mark_increment() tuples to their rollup rows, dropping rows left without marks"""
+    session = session or db.session
+    connection = session.connection()
+    totals = {}
+    for month, subject_id, department, student_active, exam_type, mark_count, scored_count, marks_sum in increments:
+        total = totals.setdefault((month, subject_id, department, student_active, exam_type), [0, 0, 0.0])
+        total[0] += mark_count
+        total[1] += scored_count
+        total[2] += marks_sum
+    # An updated mark that stayed in its row cancels out to nothing
+    totals = {key: total for key, total in totals.items() if any(total)}
+    if not totals:
+        return
+
+    # Also taken by refresh_rollups, so an increment never lands between its read and its write
+    buckets = {(subject_id, month) for month, subject_id, *_ in totals}
+    lock_rollup_buckets(connection, buckets)
+    statement = add_to_rollups_statement(connection.dialect.name)
+    if statement is None:
+        # The marks are already written, so recomputing their buckets gives the same rows
+        refresh_rollups(buckets, session=session)
+        return
+    connection.execute(statement, [{
+        'month': month,
+        'subject_id': subject_id,
+        'department': department,
+        'student_active': student_active,
+        'exam_type': exam_type,
+        'mark_count': mark_count,
+        'scored_count': scored_count,
+        'marks_sum': marks_sum
+    } for (month, subject_id, department, student_active, exam_type), (mark_count, scored_count, marks_sum)
+        in totals.items()])
+    if any(mark_count < 0 for mark_count, _, _ in totals.values()):
+        # Rows whose last mark was taken away
+        months = {month for _, month in buckets}
+        for chunk in chunked(sorted({subject_id for subject_id, _ in buckets}), ROLLUP_CHUNK_SIZE):
+            connection.execute(delete(MarkRollup).where(
+                MarkRollup.mark_count <= 0, MarkRollup.subject_id.in_(chunk), MarkRollup.month.in_(months)
+            ))
+
+def student_buckets(student_ids, session=None):
+    """(subject_id, month) buckets holding any mark of the given students"""
+    session = session or db.session
+    buckets = set()
+    for chunk in chunked(sorted(student_ids), ROLLUP_CHUNK_SIZE):
+        for subject_id, created_at in session.connection().execute(
+            select(Mark.subject_id, Mark.created_at).where(Mark.student_id.in_(chunk))
+        ):
+            buckets.add((subject_id, month_key(created_at)))
+    return buckets
+
+def rebuild_rollups():
+    """Recompute every rollup row from the marks table, one month per transaction"""
+    oldest, newest = db.session.execute(select(func.min(Mark.created_at), func.max(Mark.created_at))).one()
+    months = []
+    if oldest is not None:
+        month = oldest.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        while month <= newest:
+            months.append(month_key(month))
+            month = _month_range(month_key(month))[1]
+
+    # Months that no longer have any marks
+    db.session.execute(delete(MarkRollup).where(MarkRollup.month.notin_(months)))
+    db.session.commit()
+    for month in months:
+        refresh_rollups([(None, month)])
+        db.session.commit()
+    return len(months)
+
+def mark_rollups_dirty(session, student_ids):
+    """Queue the buckets of these students' marks for a refresh at commit; for Core writes"""
+    on_commit(session, 'mark_rollups', [('student_id', sid) for sid in student_ids if sid is not None],
+              _refresh_queued_rollups)
+
+def add_to_rollups(session, increments):
+    """Queue mark_increment() tuples for when session commits.
+
+    For bulk writers that know each mark's old and new values: adding to
+    the affected rows costs the same however many marks a bucket already
+    holds, where refresh_rollups() re-aggregates the whole bucket.
+    """
+    on_commit(session, 'mark_rollups', [('increment', increment) for increment in increments],
+              _refresh_queued_rollups)
+
+def _refresh_queued_rollups(session, items):
+    buckets = {value for kind, value in items if kind == 'bucket'}
+    student_ids = {value for kind, value in items if kind == 'student_id'}
+    if student_ids:
+        buckets |= student_buckets(student_ids, session=session)
+    # A recomputed bucket already counts this transaction's marks
+    increments = [value for kind, value in items if kind == 'increment' and (value[1], value[0]) not in buckets]
+    # Locked up front in one order, as refresh and increments together may span many buckets
+    lock_rollup_buckets(session.connection(), buckets | {(subject_id, month) for month, subject_id, *_ in increments})
+    refresh_rollups(buckets, session=session)
+    apply_rollup_increments(increments, session=session)
+
+def department_rollup():
+    """(department, average mark, mark count) over active students"""
+    return db.session.execute(
+        select(
+            MarkRollup.department,
+            (func.sum(MarkRollup.marks_sum) / func.nullif(func.sum(MarkRollup.scored_count), 0)).label('avg_marks'),
+            func.sum(MarkRollup.mark_count).label('total_exams')
+        ).where(MarkRollup.student_active == True, MarkRollup.department != '')
+        .group_by(MarkRollup.department)
+    ).all()
+
+def subject_rollup():
+    """(subject name, average mark, mark count) over every mark"""
+    return db.session.execute(
+        select(
+            Subject.name,
+            (func.sum(MarkRollup.marks_sum) / func.nullif(func.sum(MarkRollup.scored_count), 0)).label('avg_marks'),
+            func.sum(MarkRollup.mark_count).label('total_exams')
+        ).join(Subject, Subject.id == MarkRollup.subject_id)
+        .group_by(Subject.name)
+    ).all()
+
+def monthly_rollup():
+    """(YYYY-MM, average mark, mark count) by the month marks were entered"""
+    return db.session.execute(
+        select(
+            MarkRollup.month,
+            (func.sum(MarkRollup.marks_sum) / func.nullif(func.sum(MarkRollup.scored_count), 0)).label('avg_marks'),
+            func.sum(MarkRollup.mark_count).label('total_exams')
+        ).group_by(MarkRollup.month).order_by(MarkRollup.month)
+    ).all()
+
+@event.listens_for(Session, 'after_flush')
+def _collect_rollup_changes(session, flush_context):
+    buckets = set()
+    student_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Mark):
+            attrs = inspect(obj).attrs
+            months = {month_key(obj.created_at)} | {month_key(value) for value in attrs.created_at.history.deleted or ()}
+            # A mark moved to another subject changes both subjects' rows
+            subject_ids = {obj.subject_id} | set(attrs.subject_id.history.deleted or ())
+            buckets.update((subject_id, month) for subject_id in subject_ids for month in months)
+        elif isinstance(obj, Student) and obj not in session.new:
+            attrs = inspect(obj).attrs
+            if obj in session.deleted or any(attrs[name].history.has_changes() for name in ROLLUP_STUDENT_COLUMNS):
+                student_ids.add(obj.id)
+    if buckets:
+        on_commit(session, 'mark_rollups', [('bucket', bucket) for bucket in buckets], _refresh_queued_rollups)
+    if student_ids:
+        mark_rollups_dirty(session, student_ids)
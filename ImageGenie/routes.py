@@ -1,18 +1,38 @@
 import os
-import csv
-import json
 from datetime import datetime
-from io import StringIO, BytesIO
-from flask import render_template, request, redirect, url_for, flash, session, jsonify, send_from_directory, make_response
-from werkzeug.utils import secure_filename
-from sqlalchemy import func, desc, asc, or_
+from flask import render_template, request, redirect, url_for, flash, session, jsonify, send_from_directory, make_response, abort
+from sqlalchemy import func, desc
+from sqlalchemy.orm import joinedload, contains_eager
 from app import db
 from models import User, Student, Subject, Mark, AuditLog, BulkOperation
 from forms import LoginForm, StudentForm, SubjectForm, MarkForm, SearchForm
-from utils import login_required, admin_required, allowed_file, create_audit_log, generate_pdf_report, export_to_excel
+from utils import login_required, admin_required, create_audit_log
+from exports import excel_export_response, csv_export_response
+from summaries import grade_distribution, top_performers
+from rollups import department_rollup, subject_rollup, monthly_rollup
+from analytics import mark_statistics, GRADE_LABELS, DISTRIBUTION_BANDS
+from search import search_students, autocomplete_students, autocomplete_subjects, AUTOCOMPLETE_LIMIT
+from pagination import keyset_paginate, cached_count
+from facets import student_facets
+from results_cache import cached_result_page, store_result_page, result_query, render_result_page
+from ratelimit import RateLimiter
+from audit import record_history, AUDIT_HISTORY_LIMIT
+from jobs import enqueue_import, enqueue_report, enqueue_photo
+from images import PHOTO_OPERATION, IMMUTABLE_MAX_AGE, store_photo, derivatives_ready, upload_response
+from publish import PUBLIC_FOLDER, current_release, find_published_result, published_url
+from reports import report_path, report_version, report_for_version
+from export_cache import data_version, export_etag, not_modified, cached_artifact, artifact_response
 
 def register_routes(app):
     
+    search_limiter = RateLimiter(app.config['RESULT_SEARCH_RATE_LIMIT'], app.config['RESULT_SEARCH_RATE_WINDOW'])
+    
+    @app.before_request
+    def raise_import_upload_limit():
+        # Must run before the form is parsed; Werkzeug spools the upload to a temp file
+        if request.endpoint == 'bulk_operations' and request.method == 'POST':
+            request.max_content_length = app.config['IMPORT_MAX_CONTENT_LENGTH']
+    
     @app.route('/')
     def index():
         # Get basic statistics
@@ -22,7 +42,9 @@ def register_routes(app):
         
         # Recent activities
         recent_students = Student.query.filter_by(is_active=True).order_by(desc(Student.created_at)).limit(5).all()
-        recent_marks = Mark.query.order_by(desc(Mark.created_at)).limit(5).all()
+        recent_marks = Mark.query.options(
+            joinedload(Mark.student), joinedload(Mark.subject)
+        ).order_by(desc(Mark.created_at)).limit(5).all()
         
         return render_template('index.html', 
                              total_students=total_students,
@@ -71,28 +93,17 @@ def register_routes(app):
         total_marks = Mark.query.count()
         
         # Department-wise statistics
-        dept_stats = db.session.query(
+        dept_stats = [tuple(row) for row in db.session.query(
             Student.department,
             func.count(Student.id).label('count')
-        ).filter(Student.is_active == True, Student.department.isnot(None)).group_by(Student.department).all()
-        
-        # Grade distribution
-        grade_stats = {}
-        students = Student.query.filter_by(is_active=True).all()
-        for student in students:
-            grade = student.get_grade()
-            grade_stats[grade] = grade_stats.get(grade, 0) + 1
-        
-        # Top performers
-        top_students = []
-        for student in students:
-            if student.marks:
-                percentage = student.calculate_percentage()
-                top_students.append({'student': student, 'percentage': percentage})
-        top_students = sorted(top_students, key=lambda x: x['percentage'], reverse=True)[:10]
+        ).filter(Student.is_active == True, Student.department.isnot(None)).group_by(Student.department).all()]
+        
+        # Grade distribution and top performers, aggregated in the database
+        grade_stats = grade_distribution()
+        top_students = top_performers(limit=10)
         
         # Recent activities
-        recent_activities = AuditLog.query.order_by(desc(AuditLog.timestamp)).limit(10).all()
+        recent_activities = AuditLog.query.options(joinedload(AuditLog.user)).order_by(desc(AuditLog.timestamp)).limit(10).all()
         
         return render_template('dashboard.html',
                              total_students=total_students,
@@ -106,21 +117,15 @@ def register_routes(app):
     @app.route('/students')
     @login_required
     def all_students():
-        page = request.args.get('page', 1, type=int)
         search = request.args.get('search', '')
         department = request.args.get('department', '')
         semester = request.args.get('semester', '', type=str)
         
         query = Student.query.filter_by(is_active=True)
+        sort_keys = [Student.roll_no]
         
         if search:
-            query = query.filter(
-                or_(
-                    Student.name.contains(search),
-                    Student.roll_no.contains(search),
-                    Student.email.contains(search)
-                )
-            )
+            query, sort_keys = search_students(query, search)
         
         if department:
             query = query.filter(Student.department == department)
@@ -128,26 +133,39 @@ def register_routes(app):
         if semester:
             query = query.filter(Student.semester == int(semester))
         
-        students = query.order_by(Student.roll_no).paginate(
-            page=page, per_page=20, error_out=False
+        # Cursor pages are a range scan on the sort keys, however deep they go
+        students = keyset_paginate(
+            query.options(joinedload(Student.result_summary)),
+            sort_keys,
+            after=request.args.get('after'),
+            before=request.args.get('before'),
+            per_page=20,
+            total=cached_count(('students', search.strip(), department, semester), query)
         )
         
-        # Get unique departments and semesters for filter
-        departments = db.session.query(Student.department).filter(
-            Student.department.isnot(None), Student.is_active == True
-        ).distinct().all()
-        semesters = db.session.query(Student.semester).filter(
-            Student.semester.isnot(None), Student.is_active == True
-        ).distinct().all()
+        # Filter options come from the shared facet cache, not a scan per view
+        facets = student_facets()
         
         return render_template('all_students.html', 
                              students=students,
-                             departments=[d[0] for d in departments],
-                             semesters=[s[0] for s in semesters],
+                             departments=facets['departments'],
+                             semesters=facets['semesters'],
                              search=search,
                              current_department=department,
                              current_semester=semester)
     
+    @app.route('/api/students/autocomplete')
+    @login_required
+    def students_autocomplete():
+        limit = min(request.args.get('limit', AUTOCOMPLETE_LIMIT, type=int), 50)
+        return jsonify(autocomplete_students(request.args.get('q', ''), limit))
+    
+    @app.route('/api/subjects/autocomplete')
+    @login_required
+    def subjects_autocomplete():
+        limit = min(request.args.get('limit', AUTOCOMPLETE_LIMIT, type=int), 50)
+        return jsonify(autocomplete_subjects(request.args.get('q', ''), limit))
+    
     @app.route('/add_student', methods=['GET', 'POST'])
     @login_required
     def add_student():
@@ -167,15 +185,15 @@ def register_routes(app):
             
             # Handle image upload
             if form.image.data:
-                filename = secure_filename(f"{form.roll_no.data}_{form.image.data.filename}")
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                form.image.data.save(filepath)
+                filename, filepath = store_photo(form.image.data)
                 student.image_filename = filename
+                # Thumbnails are made by the worker; pages use the original until then
+                if not derivatives_ready(filename):
+                    enqueue_photo(filepath, session['user_id'])
             
             db.session.add(student)
             db.session.commit()
             
-            create_audit_log('CREATE', 'students', student.id, None, student.__dict__, request.remote_addr)
             flash('Student added successfully!', 'success')
             return redirect(url_for('all_students'))
         
@@ -188,8 +206,6 @@ def register_routes(app):
         form = StudentForm(original_roll_no=student.roll_no, obj=student)
         
         if form.validate_on_submit():
-            old_values = student.__dict__.copy()
-            
             student.roll_no = form.roll_no.data
             student.name = form.name.data
             student.email = form.email.data or None
@@ -203,20 +219,14 @@ def register_routes(app):
             
             # Handle image upload
             if form.image.data:
-                # Remove old image if exists
-                if student.image_filename:
-                    old_path = os.path.join(app.config['UPLOAD_FOLDER'], student.image_filename)
-                    if os.path.exists(old_path):
-                        os.remove(old_path)
-                
-                filename = secure_filename(f"{form.roll_no.data}_{form.image.data.filename}")
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                form.image.data.save(filepath)
+                # The previous photo may be shared; `flask gc-photos` removes it once unreferenced
+                filename, filepath = store_photo(form.image.data)
                 student.image_filename = filename
+                if not derivatives_ready(filename):
+                    enqueue_photo(filepath, session['user_id'])
             
             db.session.commit()
             
-            create_audit_log('UPDATE', 'students', student.id, old_values, student.__dict__, request.remote_addr)
             flash('Student updated successfully!', 'success')
             return redirect(url_for('all_students'))
         
@@ -226,13 +236,12 @@ def register_routes(app):
     @admin_required
     def delete_student(student_id):
         student = Student.query.get_or_404(student_id)
-        old_values = student.__dict__.copy()
         
         student.is_active = False
+        # The photo is kept for a reactivation; `flask gc-photos --include-inactive` reclaims it
         student.updated_at = datetime.utcnow()
         db.session.commit()
         
-        create_audit_log('DELETE', 'students', student.id, old_values, student.__dict__, request.remote_addr)
         flash(f'Student {student.name} has been deactivated.', 'success')
         return redirect(url_for('all_students'))
     
@@ -240,7 +249,26 @@ def register_routes(app):
     @login_required
     def all_subjects():
         subjects = Subject.query.filter_by(is_active=True).order_by(Subject.code).all()
-        return render_template('all_subjects.html', subjects=subjects)
+        
+        # Per-subject mark counts and averages in one query instead of loading subject.marks
+        subject_stats = {
+            subject_id: {'count': count, 'avg': avg_marks or 0}
+            for subject_id, count, avg_marks in db.session.query(
+                Mark.subject_id, func.count(Mark.id), func.avg(Mark.marks_obtained)
+            ).group_by(Mark.subject_id).all()
+        }
+        # Enrollment totals for the summary cards, from the same counts
+        enrollments = {'total': 0, 'by_department': {}, 'no_department': 0}
+        for subject in subjects:
+            count = subject_stats.get(subject.id, {}).get('count', 0)
+            enrollments['total'] += count
+            if subject.department:
+                enrollments['by_department'][subject.department] = \
+                    enrollments['by_department'].get(subject.department, 0) + count
+            else:
+                enrollments['no_department'] += count
+        return render_template('all_subjects.html', subjects=subjects, subject_stats=subject_stats,
+                               enrollments=enrollments)
     
     @app.route('/add_subject', methods=['GET', 'POST'])
     @admin_required
@@ -258,7 +286,6 @@ def register_routes(app):
             db.session.add(subject)
             db.session.commit()
             
-            create_audit_log('CREATE', 'subjects', subject.id, None, subject.__dict__, request.remote_addr)
             flash('Subject added successfully!', 'success')
             return redirect(url_for('all_subjects'))
         
@@ -277,13 +304,11 @@ def register_routes(app):
             ).first()
             
             if existing_mark:
-                old_values = existing_mark.__dict__.copy()
                 existing_mark.marks_obtained = form.marks_obtained.data
                 existing_mark.total_marks = form.total_marks.data
                 existing_mark.exam_date = form.exam_date.data
                 existing_mark.updated_at = datetime.utcnow()
                 
-                create_audit_log('UPDATE', 'marks', existing_mark.id, old_values, existing_mark.__dict__, request.remote_addr)
                 flash('Marks updated successfully!', 'success')
             else:
                 mark = Mark(
@@ -296,14 +321,15 @@ def register_routes(app):
                 )
                 
                 db.session.add(mark)
-                create_audit_log('CREATE', 'marks', None, None, mark.__dict__, request.remote_addr)
                 flash('Marks added successfully!', 'success')
             
             db.session.commit()
             return redirect(url_for('add_marks'))
         
         # Get all marks for display
-        marks = Mark.query.join(Student).join(Subject).order_by(desc(Mark.created_at)).limit(20).all()
+        marks = Mark.query.join(Student).join(Subject).options(
+            contains_eager(Mark.student), contains_eager(Mark.subject)
+        ).order_by(desc(Mark.created_at)).limit(20).all()
         
         return render_template('add_marks.html', form=form, marks=marks)
     
@@ -312,7 +338,21 @@ def register_routes(app):
         form = SearchForm()
         student = None
         
-        if form.validate_on_submit():
+        if request.method == 'POST':
+            retry_after = search_limiter.hit(request.remote_addr)
+            if retry_after:
+                flash('Too many searches. Please wait a moment and try again.', 'error')
+                response = make_response(render_template('search_result.html', form=form, student=None), 429)
+                response.headers['Retry-After'] = str(retry_after)
+                return response
+        
+        if form.validate_on_submit() and app.config['SERVE_PUBLISHED_RESULTS']:
+            # Answered from the published index alone; the database is not queried
+            token, error = find_published_result(form.roll_no.data, form.date_of_birth.data)
+            if token:
+                return redirect(published_url(token))
+            flash(error, 'error')
+        elif form.validate_on_submit():
             student = Student.query.filter_by(
                 roll_no=form.roll_no.data,
                 is_active=True
@@ -335,16 +375,24 @@ def register_routes(app):
     
     @app.route('/view_result/<roll_no>')
     def view_result(roll_no):
-        student = Student.query.filter_by(roll_no=roll_no, is_active=True).first_or_404()
-        
-        # Group marks by exam type
-        marks_by_exam = {}
-        for mark in student.marks:
-            if mark.exam_type not in marks_by_exam:
-                marks_by_exam[mark.exam_type] = []
-            marks_by_exam[mark.exam_type].append(mark)
-        
-        return render_template('view_result.html', student=student, marks_by_exam=marks_by_exam)
+        if app.config['SERVE_PUBLISHED_RESULTS'] and not session.get('user_id'):
+            token, _ = find_published_result(roll_no)
+            if token is None:
+                abort(404)
+            return redirect(published_url(token))
+        
+        # Every anonymous visitor sees the same page, so results-day traffic is served from the shared cache
+        cacheable = not session.get('user_id') and not session.get('_flashes')
+        if cacheable:
+            html = cached_result_page(roll_no)
+            if html is not None:
+                return html
+        
+        student = result_query().filter_by(roll_no=roll_no).first_or_404()
+        html = render_result_page(student)
+        if cacheable:
+            store_result_page(roll_no, html)
+        return html
     
     @app.route('/bulk_operations', methods=['GET', 'POST'])
     @admin_required
@@ -358,11 +406,13 @@ def register_routes(app):
                 return handle_import_marks()
             
         # Get recent bulk operations
-        recent_operations = BulkOperation.query.order_by(desc(BulkOperation.created_at)).limit(10).all()
+        recent_operations = BulkOperation.query.options(
+            joinedload(BulkOperation.user)
+        ).filter(BulkOperation.operation_type != PHOTO_OPERATION).order_by(desc(BulkOperation.created_at)).limit(10).all()
         
         return render_template('bulk_operations.html', recent_operations=recent_operations)
     
-    def handle_import_students():
+    def _queue_import(operation_type):
         if 'csv_file' not in request.files:
             flash('No file selected!', 'error')
             return redirect(url_for('bulk_operations'))
@@ -376,292 +426,105 @@ def register_routes(app):
             flash('Please upload a CSV file!', 'error')
             return redirect(url_for('bulk_operations'))
         
-        # Create bulk operation record
-        bulk_op = BulkOperation(
-            operation_type='import_students',
-            user_id=session['user_id']
+        # The import itself runs in a `flask worker` process; the request only stores the file
+        bulk_op = enqueue_import(
+            operation_type,
+            file,
+            session['user_id'],
+            options={'skip_header': bool(request.form.get('skip_header'))}
         )
-        db.session.add(bulk_op)
-        db.session.commit()
-        
-        try:
-            # Read CSV file
-            stream = StringIO(file.stream.read().decode("UTF8"), newline=None)
-            csv_reader = csv.reader(stream)
-            
-            skip_header = request.form.get('skip_header')
-            if skip_header:
-                next(csv_reader)  # Skip header row
-            
-            students_data = []
-            errors = []
-            line_number = 1 if not skip_header else 2
-            
-            for row in csv_reader:
-                try:
-                    if len(row) < 2:  # At least roll_no and name required
-                        errors.append(f"Line {line_number}: Insufficient data")
-                        continue
-                    
-                    roll_no = row[0].strip()
-                    name = row[1].strip()
-                    email = row[2].strip() if len(row) > 2 and row[2].strip() else None
-                    phone = row[3].strip() if len(row) > 3 and row[3].strip() else None
-                    
-                    # Parse date of birth
-                    dob = None
-                    if len(row) > 4 and row[4].strip():
-                        try:
-                            dob = datetime.strptime(row[4].strip(), '%Y-%m-%d').date()
-                        except ValueError:
-                            errors.append(f"Line {line_number}: Invalid date format for {roll_no}")
-                            continue
-                    
-                    department = row[5].strip() if len(row) > 5 and row[5].strip() else None
-                    semester = int(row[6]) if len(row) > 6 and row[6].strip().isdigit() else None
-                    admission_year = int(row[7]) if len(row) > 7 and row[7].strip().isdigit() else None
-                    address = row[8].strip() if len(row) > 8 and row[8].strip() else None
-                    
-                    # Check if student already exists
-                    existing_student = Student.query.filter_by(roll_no=roll_no).first()
-                    if existing_student:
-                        errors.append(f"Line {line_number}: Student with roll number {roll_no} already exists")
-                        continue
-                    
-                    students_data.append({
-                        'roll_no': roll_no,
-                        'name': name,
-                        'email': email,
-                        'phone': phone,
-                        'date_of_birth': dob,
-                        'department': department,
-                        'semester': semester,
-                        'admission_year': admission_year,
-                        'address': address
-                    })
-                    
-                except Exception as e:
-                    errors.append(f"Line {line_number}: {str(e)}")
-                
-                line_number += 1
-            
-            # Bulk insert students
-            successful_imports = 0
-            for student_data in students_data:
-                try:
-                    student = Student(**student_data)
-                    db.session.add(student)
-                    successful_imports += 1
-                except Exception as e:
-                    errors.append(f"Failed to import {student_data['roll_no']}: {str(e)}")
-            
-            # Update bulk operation
-            bulk_op.total_records = len(students_data) + len(errors)
-            bulk_op.processed_records = successful_imports
-            bulk_op.failed_records = len(errors)
-            bulk_op.status = 'completed'
-            bulk_op.completed_at = datetime.utcnow()
-            bulk_op.error_log = '\n'.join(errors) if errors else None
-            
-            db.session.commit()
-            
-            flash(f'Import completed! {successful_imports} students imported successfully. {len(errors)} errors.', 'success')
-            if errors:
-                flash(f'Errors encountered: {"; ".join(errors[:5])}{"..." if len(errors) > 5 else ""}', 'warning')
-            
-        except Exception as e:
-            bulk_op.status = 'failed'
-            bulk_op.error_log = str(e)
-            db.session.commit()
-            flash(f'Import failed: {str(e)}', 'error')
-        
+        flash(f'Import queued (operation #{bulk_op.id}). Progress is shown below.', 'info')
         return redirect(url_for('bulk_operations'))
     
+    def handle_import_students():
+        return _queue_import('import_students')
+    
     def handle_import_marks():
-        if 'csv_file' not in request.files:
-            flash('No file selected!', 'error')
-            return redirect(url_for('bulk_operations'))
-        
-        file = request.files['csv_file']
-        if file.filename == '' or file.filename is None:
-            flash('No file selected!', 'error')
-            return redirect(url_for('bulk_operations'))
-        
-        if not (file.filename and file.filename.endswith('.csv')):
-            flash('Please upload a CSV file!', 'error')
+        return _queue_import('import_marks')
+    
+    @app.route('/api/bulk-operation/<int:operation_id>/status')
+    @admin_required
+    def bulk_operation_status(operation_id):
+        bulk_op = db.session.get(BulkOperation, operation_id)
+        if bulk_op is None:
+            return jsonify({'error': 'Operation not found'}), 404
+        return jsonify(bulk_op.to_status_dict())
+    
+    @app.route('/reports/<int:operation_id>/download')
+    @admin_required
+    def download_report(operation_id):
+        bulk_op = db.session.get(BulkOperation, operation_id)
+        if bulk_op is None or bulk_op.operation_type != 'export_pdf' or bulk_op.status != 'completed' \
+                or not cached_artifact(report_path(operation_id)):
+            flash('Report is not available!', 'error')
             return redirect(url_for('bulk_operations'))
         
-        # Create bulk operation record
-        bulk_op = BulkOperation(
-            operation_type='import_marks',
-            user_id=session['user_id']
+        return artifact_response(
+            report_path(operation_id),
+            export_etag('pdf', report_version(bulk_op)),
+            'application/pdf',
+            f'student_results_{operation_id}.pdf'
         )
-        db.session.add(bulk_op)
-        db.session.commit()
-        
-        try:
-            # Read CSV file
-            stream = StringIO(file.stream.read().decode("UTF8"), newline=None)
-            csv_reader = csv.reader(stream)
-            
-            skip_header = request.form.get('skip_header')
-            if skip_header:
-                next(csv_reader)
-            
-            marks_data = []
-            errors = []
-            line_number = 1 if not skip_header else 2
-            
-            for row in csv_reader:
-                try:
-                    if len(row) < 4:  # At least roll_no, subject_code, marks_obtained, total_marks required
-                        errors.append(f"Line {line_number}: Insufficient data")
-                        continue
-                    
-                    roll_no = row[0].strip()
-                    subject_code = row[1].strip()
-                    marks_obtained = float(row[2])
-                    total_marks = float(row[3])
-                    exam_type = row[4].strip() if len(row) > 4 and row[4].strip() else 'Final'
-                    
-                    # Parse exam date
-                    exam_date = None
-                    if len(row) > 5 and row[5].strip():
-                        try:
-                            exam_date = datetime.strptime(row[5].strip(), '%Y-%m-%d').date()
-                        except ValueError:
-                            errors.append(f"Line {line_number}: Invalid date format")
-                            continue
-                    
-                    # Find student and subject
-                    student = Student.query.filter_by(roll_no=roll_no).first()
-                    if not student:
-                        errors.append(f"Line {line_number}: Student {roll_no} not found")
-                        continue
-                    
-                    subject = Subject.query.filter_by(code=subject_code).first()
-                    if not subject:
-                        errors.append(f"Line {line_number}: Subject {subject_code} not found")
-                        continue
-                    
-                    marks_data.append({
-                        'student_id': student.id,
-                        'subject_id': subject.id,
-                        'marks_obtained': marks_obtained,
-                        'total_marks': total_marks,
-                        'exam_type': exam_type,
-                        'exam_date': exam_date
-                    })
-                    
-                except Exception as e:
-                    errors.append(f"Line {line_number}: {str(e)}")
-                
-                line_number += 1
-            
-            # Bulk insert marks
-            successful_imports = 0
-            for mark_data in marks_data:
-                try:
-                    # Check if mark already exists
-                    existing_mark = Mark.query.filter_by(
-                        student_id=mark_data['student_id'],
-                        subject_id=mark_data['subject_id'],
-                        exam_type=mark_data['exam_type']
-                    ).first()
-                    
-                    if existing_mark:
-                        # Update existing mark
-                        existing_mark.marks_obtained = mark_data['marks_obtained']
-                        existing_mark.total_marks = mark_data['total_marks']
-                        existing_mark.exam_date = mark_data['exam_date']
-                        existing_mark.updated_at = datetime.utcnow()
-                    else:
-                        # Create new mark
-                        mark = Mark(**mark_data)
-                        db.session.add(mark)
-                    
-                    successful_imports += 1
-                except Exception as e:
-                    errors.append(f"Failed to import mark: {str(e)}")
-            
-            # Update bulk operation
-            bulk_op.total_records = len(marks_data) + len(errors)
-            bulk_op.processed_records = successful_imports
-            bulk_op.failed_records = len(errors)
-            bulk_op.status = 'completed'
-            bulk_op.completed_at = datetime.utcnow()
-            bulk_op.error_log = '\n'.join(errors) if errors else None
-            
-            db.session.commit()
-            
-            flash(f'Import completed! {successful_imports} marks imported successfully. {len(errors)} errors.', 'success')
-            if errors:
-                flash(f'Errors encountered: {"; ".join(errors[:5])}{"..." if len(errors) > 5 else ""}', 'warning')
-            
-        except Exception as e:
-            bulk_op.status = 'failed'
-            bulk_op.error_log = str(e)
-            db.session.commit()
-            flash(f'Import failed: {str(e)}', 'error')
-        
-        return redirect(url_for('bulk_operations'))
+    
+    @app.route('/api/audit/<table_name>/<int:record_id>')
+    @admin_required
+    def audit_history(table_name, record_id):
+        limit = min(request.args.get('limit', AUDIT_HISTORY_LIMIT, type=int), 200)
+        return jsonify(record_history(table_name, record_id, before=request.args.get('before'), limit=limit))
     
     @app.route('/analytics')
     @login_required
     def analytics():
-        # Performance analytics
-        dept_performance = db.session.query(
-            Student.department,
-            func.avg(Mark.marks_obtained).label('avg_marks'),
-            func.count(Mark.id).label('total_exams')
-        ).join(Mark).filter(
-            Student.is_active == True,
-            Student.department.isnot(None)
-        ).group_by(Student.department).all()
-        
-        # Subject-wise performance
-        subject_performance = db.session.query(
-            Subject.name,
-            func.avg(Mark.marks_obtained).label('avg_marks'),
-            func.count(Mark.id).label('total_exams')
-        ).join(Mark).group_by(Subject.name).all()
-        
-        # Monthly trends - using PostgreSQL date functions
-        monthly_trends = db.session.query(
-            func.to_char(Mark.created_at, 'YYYY-MM').label('month'),
-            func.avg(Mark.marks_obtained).label('avg_marks'),
-            func.count(Mark.id).label('total_exams')
-        ).group_by(func.to_char(Mark.created_at, 'YYYY-MM')).order_by('month').all()
-        
+        # Read from the rollup tables, which stay small however many marks there are
+        # Distributions need every mark; they are computed in one pass and cached per data version
         return render_template('analytics.html',
-                             dept_performance=dept_performance,
-                             subject_performance=subject_performance,
-                             monthly_trends=monthly_trends)
+                             dept_performance=department_rollup(),
+                             subject_performance=subject_rollup(),
+                             monthly_trends=monthly_rollup(),
+                             statistics=mark_statistics(),
+                             grade_labels=GRADE_LABELS,
+                             distribution_bands=DISTRIBUTION_BANDS)
     
     @app.route('/export_results/<format>')
     @admin_required
     def export_results(format):
-        students = Student.query.filter_by(is_active=True).all()
-        
         if format == 'pdf':
-            pdf_content = generate_pdf_report(students)
-            response = make_response(pdf_content)
-            response.headers['Content-Type'] = 'application/pdf'
-            response.headers['Content-Disposition'] = 'attachment; filename=student_results.pdf'
-            return response
+            version = data_version()
+            etag = export_etag('pdf', version)
+            response = not_modified(etag)
+            if response:
+                return response
+            
+            bulk_op = report_for_version(version)
+            if bulk_op and bulk_op.status == 'completed' and cached_artifact(report_path(bulk_op.id)):
+                return artifact_response(report_path(bulk_op.id), etag, 'application/pdf', 'student_results.pdf')
+            if bulk_op:
+                flash(f'PDF report is already being generated (operation #{bulk_op.id}).', 'info')
+                return redirect(url_for('bulk_operations'))
+            
+            # Rendering every student is too slow for a request; the worker builds it
+            bulk_op = enqueue_report(session['user_id'])
+            flash(f'PDF report queued (operation #{bulk_op.id}). It can be downloaded below once completed.', 'info')
+            return redirect(url_for('bulk_operations'))
         elif format == 'excel':
-            excel_content = export_to_excel(students)
-            response = make_response(excel_content)
-            response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            response.headers['Content-Disposition'] = 'attachment; filename=student_results.xlsx'
-            return response
+            return excel_export_response()
+        elif format == 'csv':
+            return csv_export_response()
         else:
             flash('Invalid export format!', 'error')
             return redirect(url_for('all_students'))
     
-    @app.route('/uploads/<filename>')
+    @app.route('/published/<path:filename>')
+    def published_file(filename):
+        # Normally answered by the static server in front; this covers running without one
+        release = current_release()
+        if release is None:
+            abort(404)
+        return send_from_directory(os.path.join(release, PUBLIC_FOLDER), filename, max_age=IMMUTABLE_MAX_AGE)
+    
+    @app.route('/uploads/<path:filename>')
     def uploaded_file(filename):
-        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+        return upload_response(filename)
     
     @app.errorhandler(404)
     def not_found_error(error):
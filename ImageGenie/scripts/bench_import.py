@@ -0,0 +1,136 @@
+"""Benchmark the CSV importers through the worker's run_import().
+
+Writes synthetic students and marks into the database named by DATABASE_URL
+and prints rows per second for a student import, a marks import that inserts
+and the same marks import again, which updates. Use a scratch database: the
+rows are left behind, under a roll number prefix unique to each run.
+
+    DATABASE_URL=sqlite:////tmp/bench.db python scripts/bench_import.py
+    DATABASE_URL=postgresql://localhost/bench python scripts/bench_import.py --students 20000 --marks 50000
+
+--row-by-row swaps in the per-row writers the importers used before they
+were batched (one lookup per row, ORM objects), for the "before" numbers.
+"""
+import os
+import sys
+import csv
+import time
+import logging
+import random
+import argparse
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# ORM writes in --row-by-row are audited; a background writer would contend for SQLite's lock
+os.environ.setdefault('AUDIT_SYNCHRONOUS', '1')
+
+EXAM_TYPES = ('Final', 'Mid-term', 'Assignment', 'Quiz')
+
+def write_students_row_by_row(chunk, progress, lookups):
+    from app import db
+    from models import Student
+    for line_number, record in chunk:
+        if Student.query.filter_by(roll_no=record['roll_no']).first():
+            progress.error(f"Line {line_number}: Student with roll number {record['roll_no']} already exists",
+                           line_number)
+            continue
+        db.session.add(Student(**record))
+        progress.processed += 1
+
+def write_marks_row_by_row(chunk, progress, lookups):
+    from app import db
+    from models import Student, Subject, Mark
+    for line_number, record in chunk:
+        student = Student.query.filter_by(roll_no=record['roll_no']).first()
+        if not student:
+            progress.error(f"Line {line_number}: Student {record['roll_no']} not found", line_number)
+            continue
+        subject = Subject.query.filter_by(code=record['subject_code']).first()
+        if not subject:
+            progress.error(f"Line {line_number}: Subject {record['subject_code']} not found", line_number)
+            continue
+        mark = Mark.query.filter_by(student_id=student.id, subject_id=subject.id,
+                                    exam_type=record['exam_type']).first()
+        if mark:
+            mark.marks_obtained = record['marks_obtained']
+            mark.total_marks = record['total_marks']
+            mark.exam_date = record['exam_date']
+            mark.updated_at = datetime.utcnow()
+        else:
+            db.session.add(Mark(student_id=student.id, subject_id=subject.id,
+                                marks_obtained=record['marks_obtained'], total_marks=record['total_marks'],
+                                exam_type=record['exam_type'], exam_date=record['exam_date']))
+        progress.processed += 1
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerows(rows)
+
+def timed_import(operation_type, path, user_id):
+    from app import db
+    from models import BulkOperation
+    from importers import run_import
+    bulk_op = BulkOperation(operation_type=operation_type, status='processing', user_id=user_id,
+                            source_file=path, options='{}', started_at=datetime.utcnow())
+    db.session.add(bulk_op)
+    db.session.commit()
+    started = time.perf_counter()
+    progress = run_import(bulk_op, path, skip_header=False)
+    elapsed = time.perf_counter() - started
+    if progress.failed:
+        print(f"  {progress.failed} rows failed, e.g. {progress.errors[:1]}")
+    return progress.processed, elapsed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the CSV importers.')
+    parser.add_argument('--students', type=int, default=20000)
+    parser.add_argument('--subjects', type=int, default=10)
+    parser.add_argument('--marks', type=int, default=50000)
+    parser.add_argument('--row-by-row', action='store_true', help='Use the pre-batching per-row writers')
+    args = parser.parse_args(argv)
+    if args.marks > args.students * args.subjects * len(EXAM_TYPES):
+        parser.error('--marks exceeds the distinct student/subject/exam combinations')
+
+    from app import app, db
+    from models import User, Subject
+    import importers
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if args.row_by_row:
+        parse, prepare, _ = importers.IMPORTERS['import_students']
+        importers.IMPORTERS['import_students'] = (parse, prepare, write_students_row_by_row)
+        parse, prepare, _ = importers.IMPORTERS['import_marks']
+        importers.IMPORTERS['import_marks'] = (parse, prepare, write_marks_row_by_row)
+
+    prefix = f"BENCH{int(time.time())}-"
+    rng = random.Random(0)
+    workdir = tempfile.mkdtemp(prefix='bench-import-')
+    students_csv = os.path.join(workdir, 'students.csv')
+    marks_csv = os.path.join(workdir, 'marks.csv')
+    write_csv(students_csv, [
+        [f"{prefix}{i}", f"Student {i}", f"{prefix.lower()}{i}@example.com", '', '2004-01-01',
+         rng.choice(['CSE', 'ECE', 'ME', 'CE']), rng.randint(1, 8), 2022, '']
+        for i in range(args.students)
+    ])
+    combinations = ((i % args.students, (i // args.students) % args.subjects,
+                     EXAM_TYPES[i // (args.students * args.subjects)]) for i in range(args.marks))
+    write_csv(marks_csv, [
+        [f"{prefix}{student}", f"{prefix}S{subject}", round(rng.uniform(0, 100), 1), 100, exam_type, '2025-05-01']
+        for student, subject, exam_type in combinations
+    ])
+
+    with app.app_context():
+        print(f"{db.engine.url.render_as_string(hide_password=True)} ({'row by row' if args.row_by_row else 'batched'})")
+        user_id = User.query.filter_by(username='admin').first().id
+        db.session.add_all(Subject(code=f"{prefix}S{i}", name=f"Bench subject {i}") for i in range(args.subjects))
+        db.session.commit()
+
+        for label, operation_type, path in (('students', 'import_students', students_csv),
+                                            ('marks insert', 'import_marks', marks_csv),
+                                            ('marks update', 'import_marks', marks_csv)):
+            rows, elapsed = timed_import(operation_type, path, user_id)
+            print(f"{label:>13}: {rows} rows in {elapsed:.2f}s ({rows / elapsed:,.0f} rows/s)")
+
+if __name__ == '__main__':
+    main()
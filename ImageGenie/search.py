@@ -0,0 +1,198 @@
+import logging
+from flask import current_app
+from sqlalchemy import text, select, func, or_, and_, table, column, literal_column
+from sqlalchemy.exc import DBAPIError
+from app import db
+from models import Student, Subject
+
+# Trigram indexes can only narrow down terms of at least three characters
+MIN_INDEXED_TERM = 3
+# Above this many hits, ranking costs more than it is worth; results keep roll number order
+RANKED_SEARCH_LIMIT = 1000
+AUTOCOMPLETE_LIMIT = 10
+# Upper bound for prefix range scans: sorts after any string that starts with the prefix
+MAX_CHAR = '\U0010ffff'
+
+# Case-insensitive btree keys for autocomplete prefix scans
+SQLITE_PREFIX_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_students_roll_no_nocase ON students (roll_no COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS ix_students_name_nocase ON students (name COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS ix_subjects_code_nocase ON subjects (code COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS ix_subjects_name_nocase ON subjects (name COLLATE NOCASE)"
+]
+
+POSTGRESQL_PREFIX_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS ix_students_roll_no_prefix ON students ((lower(roll_no) COLLATE "C"))',
+    'CREATE INDEX IF NOT EXISTS ix_students_name_prefix ON students ((lower(name) COLLATE "C"))',
+    'CREATE INDEX IF NOT EXISTS ix_subjects_code_prefix ON subjects ((lower(code) COLLATE "C"))',
+    'CREATE INDEX IF NOT EXISTS ix_subjects_name_prefix ON subjects ((lower(name) COLLATE "C"))'
+]
+
+SQLITE_DDL = [
+    # External-content table: it indexes students' columns without storing a copy
+    """CREATE VIRTUAL TABLE students_fts USING fts5(
+        name, roll_no, email, content='students', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER students_fts_insert AFTER INSERT ON students BEGIN
+        INSERT INTO students_fts(rowid, name, roll_no, email) VALUES (new.id, new.name, new.roll_no, new.email);
+    END""",
+    """CREATE TRIGGER students_fts_delete AFTER DELETE ON students BEGIN
+        INSERT INTO students_fts(students_fts, rowid, name, roll_no, email)
+        VALUES ('delete', old.id, old.name, old.roll_no, old.email);
+    END""",
+    """CREATE TRIGGER students_fts_update AFTER UPDATE OF name, roll_no, email ON students BEGIN
+        INSERT INTO students_fts(students_fts, rowid, name, roll_no, email)
+        VALUES ('delete', old.id, old.name, old.roll_no, old.email);
+        INSERT INTO students_fts(rowid, name, roll_no, email) VALUES (new.id, new.name, new.roll_no, new.email);
+    END""",
+    # Index whatever was already in the table
+    "INSERT INTO students_fts(students_fts) VALUES ('rebuild')"
+]
+
+POSTGRESQL_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_students_name_trgm ON students USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_students_roll_no_trgm ON students USING gin (roll_no gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_students_email_trgm ON students USING gin (email gin_trgm_ops)"
+]
+
+students_fts = table('students_fts', column('rowid'), column('name'), column('roll_no'))
+
+def install_search_index(app):
+    """Create the dialect's search index if missing and record which backend is usable"""
+    dialect = db.engine.dialect.name
+    prefix_indexes = {'sqlite': SQLITE_PREFIX_INDEXES, 'postgresql': POSTGRESQL_PREFIX_INDEXES}.get(dialect, [])
+    with db.engine.begin() as connection:
+        for statement in prefix_indexes:
+            connection.execute(text(statement))
+
+    backend = None
+    try:
+        with db.engine.begin() as connection:
+            if dialect == 'sqlite':
+                exists = connection.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'students_fts'"
+                )).first()
+                if not exists:
+                    for statement in SQLITE_DDL:
+                        connection.execute(text(statement))
+                backend = 'fts5'
+            elif dialect == 'postgresql':
+                for statement in POSTGRESQL_DDL:
+                    connection.execute(text(statement))
+                backend = 'trgm'
+    except DBAPIError as e:
+        # e.g. SQLite built without FTS5, or no privilege to create pg_trgm
+        logging.warning(f"Indexed student search unavailable, falling back to LIKE: {e}")
+    app.config['STUDENT_SEARCH_BACKEND'] = backend
+
+def _backend():
+    return current_app.config.get('STUDENT_SEARCH_BACKEND')
+
+def _like_escape(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def _fts_phrase(term):
+    # A quoted phrase matches the term as a substring under the trigram tokenizer
+    return '"' + term.replace('"', '""') + '"'
+
+def _like(column, pattern):
+    if _backend() == 'trgm':
+        # ILIKE is what the gin_trgm_ops indexes accelerate
+        return column.ilike(pattern, escape='\\')
+    return column.like(pattern, escape='\\')
+
+def _contains_filter(term):
+    pattern = f"%{_like_escape(term)}%"
+    return or_(*(_like(column, pattern) for column in (Student.name, Student.roll_no, Student.email)))
+
+def search_students(query, term):
+    """Filter a Student query to matches for term, best matches first.
+
+    Returns the query and its ascending sort keys, which always end in the
+    unique roll number so they can drive keyset pagination.
+    """
+    term = term.strip()
+    backend = _backend()
+    if backend is None or len(term) < MIN_INDEXED_TERM:
+        return query.filter(_contains_filter(term)), [Student.roll_no]
+
+    if backend == 'fts5':
+        match = literal_column('students_fts').match(_fts_phrase(term))
+        matches = db.session.execute(select(func.count()).select_from(students_fts).where(match)).scalar()
+        if matches > RANKED_SEARCH_LIMIT:
+            # Walking roll numbers in index order stops as soon as a page is filled
+            return query.filter(Student.id.in_(select(students_fts.c.rowid).where(match))), [Student.roll_no]
+
+        hits = select(
+            students_fts.c.rowid.label('student_id'),
+            func.bm25(literal_column('students_fts')).label('rank')
+        ).where(match).subquery()
+        # bm25() is lower for better matches
+        return query.join(hits, hits.c.student_id == Student.id), [hits.c.rank, Student.roll_no]
+
+    rank = func.greatest(
+        func.word_similarity(term, Student.name),
+        func.word_similarity(term, Student.roll_no),
+        func.word_similarity(term, func.coalesce(Student.email, ''))
+    )
+    # Negated so that, like every other key, it sorts ascending
+    return query.filter(_contains_filter(term)), [-rank, Student.roll_no]
+
+def _prefix_key(searched):
+    """Sort key matching the dialect's prefix index, or None to fall back to LIKE"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        return searched.collate('NOCASE')
+    if dialect == 'postgresql':
+        return func.lower(searched).collate('C')
+    return None
+
+def _prefix_matches(model, columns, fields, prefix, limit):
+    """Active rows of model with a prefix match in columns (in that order), as dicts of fields.
+
+    Each column is a bounded range scan over its case-insensitive index, so
+    the cost depends on limit rather than on how many rows match.
+    """
+    prefix = prefix.strip()
+    if not prefix:
+        return []
+    if db.session.get_bind().dialect.name == 'postgresql':
+        prefix = prefix.lower()
+
+    results = {}
+    for searched in columns:
+        key = _prefix_key(searched)
+        if key is None:
+            condition, order = _like(searched, f"{_like_escape(prefix)}%"), searched
+        else:
+            condition, order = and_(key >= prefix, key < prefix + MAX_CHAR), key
+
+        rows = db.session.execute(
+            select(*(getattr(model, field) for field in fields))
+            .where(model.is_active == True, condition)
+            .order_by(order)
+            .limit(limit)
+        ).all()
+        for row in rows:
+            results.setdefault(row.id, dict(row._mapping))
+        if len(results) >= limit:
+            break
+
+    return list(results.values())[:limit]
+
+def autocomplete_students(prefix, limit=AUTOCOMPLETE_LIMIT):
+    """Active students whose roll number or name starts with prefix, roll numbers first"""
+    students = _prefix_matches(Student, (Student.roll_no, Student.name),
+                               ('id', 'roll_no', 'name', 'department'), prefix, limit)
+    for student in students:
+        student['label'] = f"{student['roll_no']} - {student['name']}"
+    return students
+
+def autocomplete_subjects(prefix, limit=AUTOCOMPLETE_LIMIT):
+    """Active subjects whose code or name starts with prefix, codes first"""
+    subjects = _prefix_matches(Subject, (Subject.code, Subject.name),
+                               ('id', 'code', 'name', 'department'), prefix, limit)
+    for subject in subjects:
+        subject['label'] = f"{subject['code']} - {subject['name']}"
+    return subjects
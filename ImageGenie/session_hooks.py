@@ -0,0 +1,53 @@
+"""Run work once per transaction for changes collected during its flushes.
+
+Derived data (result summaries, rollups, cached pages and facets, audit
+rows) is kept in step with ORM writes the same way everywhere: a feature's
+after_flush listener, or a Core writer that the ORM cannot see, hands what
+changed to on_commit(). When the session commits, each queued function is
+called once with everything collected for its key, inside the committing
+transaction, so readers never see the write without its derived data. A
+rollback discards the lot.
+"""
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+_PENDING_KEY = 'on_commit_pending'
+
+def on_commit(session, key, items, fn, after=False):
+    """Queue items under key; fn(session, items) runs once when session commits.
+
+    items from every call with the same key are passed together, in order.
+    With after=True fn runs once the commit has succeeded, outside the
+    transaction, e.g. for side effects that must not happen on a rollback.
+    """
+    pending = session.info.setdefault(_PENDING_KEY, {})
+    entry = pending.get(key)
+    if entry is None:
+        entry = pending[key] = (fn, after, [])
+    entry[2].extend(items)
+
+def _take(session, after):
+    pending = session.info.get(_PENDING_KEY, {})
+    keys = [key for key, (_, is_after, _) in pending.items() if is_after == after]
+    return [pending.pop(key) for key in keys]
+
+@event.listens_for(Session, 'before_commit')
+def _run_before_commit(session):
+    # Flush first so objects changed without an explicit flush are collected too
+    session.flush()
+    # A function may queue more work, e.g. by flushing; keep going until none is left
+    while True:
+        taken = _take(session, after=False)
+        if not taken:
+            return
+        for fn, _, items in taken:
+            fn(session, items)
+
+@event.listens_for(Session, 'after_commit')
+def _run_after_commit(session):
+    for fn, _, items in _take(session, after=True):
+        fn(session, items)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -48,6 +48,7 @@ function initializeApp() {
     initializeFormValidation();
     initializeFileUploads();
     initializeSearchFeatures();
+    initializeTypeaheads();
     initializeAnimations();
     
     console.log('Student Result Management System initialized successfully');
@@ -172,6 +173,11 @@ function initializeFileUploads() {
 
 // File validation
 function validateFile(file, input) {
+    // CSV imports are validated and size-limited on the server
+    if (input.accept === '.csv') {
+        return true;
+    }
+    
     const allowedTypes = ['image/jpeg', 'image/jpg', 'image/png'];
     const maxSize = 5 * 1024 * 1024; // 5MB
     
@@ -258,8 +264,97 @@ function initializeSearchFeatures() {
 function performSearch(query, input) {
     if (query.length < 2) return;
     
-    // Add search suggestions or live results here
-    console.log('Searching for:', query);
+    const url = input.dataset.autocompleteUrl;
+    const list = input.list;
+    if (!url || !list) return;
+    
+    fetch(`${url}?q=${encodeURIComponent(query)}`)
+        .then(response => response.ok ? response.json() : [])
+        .then(students => {
+            list.innerHTML = '';
+            students.forEach(student => {
+                const option = document.createElement('option');
+                option.value = student.roll_no;
+                option.label = student.name;
+                list.appendChild(option);
+            });
+        })
+        .catch(() => {});
+}
+
+// Typeahead inputs that fill a hidden id field from a JSON lookup endpoint
+function initializeTypeaheads() {
+    document.querySelectorAll('input[data-typeahead-url]').forEach(input => {
+        const target = document.getElementById(input.dataset.typeaheadTarget);
+        const menu = document.createElement('div');
+        menu.className = 'dropdown-menu w-100';
+        input.insertAdjacentElement('afterend', menu);
+        
+        let searchTimeout;
+        let active = -1;
+        
+        function choose(item) {
+            input.value = item.label;
+            target.value = item.id;
+            input.classList.remove('is-invalid');
+            menu.classList.remove('show');
+        }
+        
+        function highlight(index) {
+            const items = menu.querySelectorAll('.dropdown-item');
+            if (!items.length) return;
+            active = (index + items.length) % items.length;
+            items.forEach((item, i) => item.classList.toggle('active', i === active));
+        }
+        
+        input.addEventListener('input', function() {
+            // Typed text no longer names the chosen row
+            target.value = '';
+            clearTimeout(searchTimeout);
+            const query = this.value.trim();
+            if (!query) {
+                menu.classList.remove('show');
+                return;
+            }
+            searchTimeout = setTimeout(() => {
+                fetch(`${input.dataset.typeaheadUrl}?q=${encodeURIComponent(query)}`)
+                    .then(response => response.ok ? response.json() : [])
+                    .then(items => {
+                        menu.innerHTML = '';
+                        active = -1;
+                        items.forEach(item => {
+                            const option = document.createElement('button');
+                            option.type = 'button';
+                            option.className = 'dropdown-item';
+                            option.textContent = item.label;
+                            option.addEventListener('mousedown', e => {
+                                e.preventDefault();
+                                choose(item);
+                            });
+                            option.item = item;
+                            menu.appendChild(option);
+                        });
+                        menu.classList.toggle('show', items.length > 0);
+                    })
+                    .catch(() => {});
+            }, 200);
+        });
+        
+        input.addEventListener('keydown', function(e) {
+            if (!menu.classList.contains('show')) return;
+            if (e.key === 'ArrowDown' || e.key === 'ArrowUp') {
+                e.preventDefault();
+                highlight(active + (e.key === 'ArrowDown' ? 1 : -1));
+            } else if (e.key === 'Enter' && active >= 0) {
+                e.preventDefault();
+                choose(menu.querySelectorAll('.dropdown-item')[active].item);
+            } else if (e.key === 'Escape') {
+                menu.classList.remove('show');
+            }
+        });
+        
+        input.addEventListener('blur', () => menu.classList.remove('show'));
+    });
 }
 
 // Animation initialization
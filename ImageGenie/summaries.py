@@ -0,0 +1,160 @@
+from datetime import datetime
+from sqlalchemy import event, func, select, delete, insert, inspect, case, desc
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app import db
+from models import Student, Mark, StudentResultSummary, GRADE_THRESHOLDS, grade_for_percentage
+from session_hooks import on_commit
+from utils import chunked
+
+# Keeps IN (...) lists well below SQLite's bound-parameter limit
+SUMMARY_CHUNK_SIZE = 500
+
+def upsert_summaries_statement(dialect):
+    """INSERT ... ON CONFLICT (student_id) DO UPDATE, or None where unsupported"""
+    if dialect == 'postgresql':
+        stmt = postgresql_insert(StudentResultSummary)
+    elif dialect == 'sqlite':
+        stmt = sqlite_insert(StudentResultSummary)
+    else:
+        return None
+    return stmt.on_conflict_do_update(
+        index_elements=['student_id'],
+        set_={column: stmt.excluded[column] for column in
+              ('total_obtained', 'total_possible', 'percentage', 'grade', 'mark_count', 'last_updated')}
+    )
+
+def refresh_student_summaries(student_ids, session=None):
+    """Recompute the materialized result summary for the given students.
+
+    Runs as plain Core statements on the session's connection, so it joins the
+    caller's transaction and does not trigger ORM flush events. The student
+    rows are locked first, so concurrent writers for the same student take
+    turns and the later one totals the earlier one's committed marks.
+    """
+    session = session or db.session
+    student_ids = {sid for sid in student_ids if sid is not None}
+    if not student_ids:
+        return 0
+
+    connection = session.connection()
+    upsert = upsert_summaries_statement(connection.dialect.name)
+    now = datetime.utcnow()
+    refreshed = 0
+
+    for chunk in chunked(sorted(student_ids), SUMMARY_CHUNK_SIZE):
+        # In id order, so two writers never wait on each other's locks; a no-op on SQLite
+        connection.execute(select(Student.id).where(Student.id.in_(chunk)).order_by(Student.id).with_for_update())
+        totals = connection.execute(
+            select(
+                Student.id,
+                func.coalesce(func.sum(Mark.marks_obtained), 0.0),
+                func.coalesce(func.sum(Mark.total_marks), 0.0),
+                func.count(Mark.id)
+            ).select_from(Student).outerjoin(Mark, Mark.student_id == Student.id)
+            .where(Student.id.in_(chunk))
+            .group_by(Student.id)
+        ).all()
+
+        rows = []
+        for student_id, obtained, possible, mark_count in totals:
+            percentage = (obtained / possible * 100) if mark_count and possible > 0 else 0.0
+            rows.append({
+                'student_id': student_id,
+                'total_obtained': float(obtained),
+                'total_possible': float(possible),
+                'percentage': percentage,
+                'grade': grade_for_percentage(percentage),
+                'mark_count': mark_count,
+                'last_updated': now
+            })
+
+        if upsert is None:
+            connection.execute(delete(StudentResultSummary).where(StudentResultSummary.student_id.in_(chunk)))
+            if rows:
+                connection.execute(insert(StudentResultSummary), rows)
+        else:
+            if rows:
+                connection.execute(upsert, rows)
+            # Students deleted since they were queued
+            connection.execute(delete(StudentResultSummary).where(
+                StudentResultSummary.student_id.in_(chunk),
+                StudentResultSummary.student_id.notin_([row['student_id'] for row in rows])
+            ))
+        refreshed += len(rows)
+
+    return refreshed
+
+def rebuild_student_summaries(chunk_size=SUMMARY_CHUNK_SIZE):
+    """Backfill or repair every summary row from the marks table"""
+    total = 0
+    last_id = 0
+    while True:
+        ids = db.session.execute(
+            select(Student.id).where(Student.id > last_id).order_by(Student.id).limit(chunk_size)
+        ).scalars().all()
+        if not ids:
+            break
+        total += refresh_student_summaries(ids)
+        db.session.commit()
+        last_id = ids[-1]
+
+    # Drop rows whose student no longer exists
+    db.session.execute(
+        delete(StudentResultSummary).where(~StudentResultSummary.student_id.in_(select(Student.id)))
+    )
+    db.session.commit()
+    return total
+
+def grade_case(percentage):
+    """SQL CASE expression mirroring grade_for_percentage()"""
+    return case(
+        *[(percentage >= threshold, grade) for threshold, grade in GRADE_THRESHOLDS],
+        else_=grade_for_percentage(0)
+    )
+
+def grade_distribution():
+    """Count active students per grade in a single GROUP BY query"""
+    # Grade each student in a subquery so the outer GROUP BY only references a
+    # plain column; PostgreSQL rejects grouping by a CASE with bound parameters
+    graded = select(
+        grade_case(func.coalesce(StudentResultSummary.percentage, 0.0)).label('grade')
+    ).select_from(Student).outerjoin(
+        StudentResultSummary, StudentResultSummary.student_id == Student.id
+    ).where(Student.is_active == True).subquery()
+
+    rows = db.session.execute(
+        select(graded.c.grade, func.count()).group_by(graded.c.grade)
+    ).all()
+    return {grade: count for grade, count in rows}
+
+def top_performers(limit=10):
+    """Highest-percentage active students that have at least one mark"""
+    rows = db.session.execute(
+        select(Student, StudentResultSummary.percentage, StudentResultSummary.grade)
+        .join(StudentResultSummary, StudentResultSummary.student_id == Student.id)
+        .where(Student.is_active == True, StudentResultSummary.mark_count > 0)
+        .order_by(desc(StudentResultSummary.percentage), Student.id)
+        .limit(limit)
+    ).all()
+    return [{'student': student, 'percentage': percentage, 'grade': grade}
+            for student, percentage, grade in rows]
+
+def _refresh_queued_summaries(session, student_ids):
+    refresh_student_summaries(set(student_ids), session=session)
+
+def mark_students_dirty(session, student_ids):
+    """Queue students for a summary refresh when the session commits"""
+    on_commit(session, 'result_summaries', [sid for sid in student_ids if sid is not None], _refresh_queued_summaries)
+
+@event.listens_for(Session, 'after_flush')
+def _collect_mark_changes(session, flush_context):
+    student_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Mark):
+            student_ids.add(obj.student_id)
+            # A mark moved to another student changes both summaries
+            student_ids.update(inspect(obj).attrs.student_id.history.deleted or ())
+    if student_ids:
+        mark_students_dirty(session, student_ids)
@@ -0,0 +1,56 @@
+import os
+import sys
+import shutil
+import tempfile
+import pytest
+
+# app.py builds the app at import time from the environment, and creates its
+# folders relative to the working directory; point both at a scratch directory
+_SCRATCH = tempfile.mkdtemp(prefix='imagegenie-tests-')
+# TEST_DATABASE_URL runs the suite against another database, e.g. an empty PostgreSQL one
+os.environ['DATABASE_URL'] = os.environ.get('TEST_DATABASE_URL') or f"sqlite:///{os.path.join(_SCRATCH, 'test.db')}"
+os.environ['IMPORT_FOLDER'] = os.path.join(_SCRATCH, 'imports')
+os.environ['REPORT_FOLDER'] = os.path.join(_SCRATCH, 'reports')
+os.environ['EXPORT_CACHE_FOLDER'] = os.path.join(_SCRATCH, 'exports')
+# No background writer thread outliving the test session
+os.environ['AUDIT_SYNCHRONOUS'] = '1'
+os.chdir(_SCRATCH)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Before any test module imports models, as main.py does
+from app import app as flask_app, db as flask_db
+from models import (User, Student, Subject, Mark, StudentResultSummary, MarkRollup, AuditLog, BulkOperation,
+                    CacheEntry)
+
+@pytest.fixture(scope='session')
+def app():
+    # Any relationship a query did not eager-load raises instead of lazy loading
+    flask_app.config.update(TESTING=True, SQLALCHEMY_RAISELOAD=True, WTF_CSRF_ENABLED=False)
+    yield flask_app
+    shutil.rmtree(_SCRATCH, ignore_errors=True)
+
+@pytest.fixture
+def db(app):
+    db = flask_db
+    with app.app_context():
+        yield db
+        db.session.rollback()
+        for model in (Mark, StudentResultSummary, MarkRollup, Student, Subject, AuditLog, BulkOperation,
+                      CacheEntry, User):
+            db.session.query(model).delete()
+        db.session.commit()
+
+@pytest.fixture
+def client(app, db):
+    return app.test_client()
+
+@pytest.fixture
+def admin(db, client):
+    """An admin user, logged in on client"""
+    user = User(username='tester', email='tester@example.com', role='admin')
+    user.set_password('password')
+    db.session.add(user)
+    db.session.commit()
+    with client.session_transaction() as session:
+        session.update(user_id=user.id, username=user.username, role=user.role)
+    return user
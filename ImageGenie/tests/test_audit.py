@@ -0,0 +1,75 @@
+import json
+from models import Student, Subject, Mark, AuditLog
+
+def audit_rows(table_name, record_id):
+    return [(row.action, json.loads(row.old_values or '{}'), json.loads(row.new_values or '{}'))
+            for row in AuditLog.query.filter_by(table_name=table_name, record_id=record_id).order_by(AuditLog.id)]
+
+def test_student_changes_are_captured_as_diffs(db):
+    student = Student(roll_no='A1', name='Ada', department='CSE')
+    db.session.add(student)
+    db.session.commit()
+
+    student.name = 'Ada Lovelace'
+    db.session.commit()
+    # Setting a column to the value it already has is not a change
+    student.department = 'CSE'
+    db.session.commit()
+    student.is_active = False
+    db.session.commit()
+
+    (create, _, created), (update, old, new), (deactivate, _, deactivated) = audit_rows('students', student.id)
+    assert create == 'CREATE'
+    assert created['roll_no'] == 'A1' and created['name'] == 'Ada'
+    assert 'created_at' not in created and 'updated_at' not in created
+    assert (update, old, new) == ('UPDATE', {'name': 'Ada'}, {'name': 'Ada Lovelace'})
+    # Students are deactivated rather than deleted
+    assert (deactivate, deactivated) == ('DELETE', {'is_active': False})
+
+def test_deleted_mark_keeps_its_old_values(db):
+    student = Student(roll_no='A2', name='Alan')
+    subject = Subject(code='AUD', name='Auditing')
+    db.session.add_all([student, subject])
+    db.session.flush()
+    mark = Mark(student_id=student.id, subject_id=subject.id, marks_obtained=81, total_marks=100.0)
+    db.session.add(mark)
+    db.session.commit()
+    mark_id = mark.id
+
+    db.session.delete(mark)
+    db.session.commit()
+
+    action, old, new = audit_rows('marks', mark_id)[-1]
+    assert action == 'DELETE' and new == {}
+    assert old['marks_obtained'] == 81 and old['student_id'] == student.id
+
+def test_rolled_back_changes_are_not_audited(db):
+    student = Student(roll_no='A3', name='Grace')
+    db.session.add(student)
+    db.session.commit()
+
+    student.name = 'Never Committed'
+    db.session.flush()
+    db.session.rollback()
+    db.session.add(Student(roll_no='A4', name='Never Inserted'))
+    db.session.flush()
+    db.session.rollback()
+    # A later commit must not pick up what the rollback discarded
+    db.session.commit()
+
+    assert [action for action, _, _ in audit_rows('students', student.id)] == ['CREATE']
+    assert AuditLog.query.filter_by(table_name='students').count() == 1
+
+def test_history_api_pages_newest_first(client, db, admin):
+    student = Student(roll_no='A5', name='Edsger')
+    db.session.add(student)
+    db.session.commit()
+    for semester in (1, 2, 3):
+        student.semester = semester
+        db.session.commit()
+
+    first = client.get(f'/api/audit/students/{student.id}?limit=2').get_json()
+    assert [entry['changes']['semester']['new'] for entry in first['entries']] == [3, 2]
+    rest = client.get(f"/api/audit/students/{student.id}?limit=2&before={first['next']}").get_json()
+    assert [entry['action'] for entry in rest['entries']] == ['UPDATE', 'CREATE']
+    assert rest['next'] is None
@@ -0,0 +1,100 @@
+import pytest
+from models import Student, Subject, Mark
+from cache import cache_get
+from facets import FACETS_CACHE_KEY, student_facets
+from results_cache import cached_result_page
+from test_imports import import_csv, STUDENT_HEADER, MARK_HEADER
+
+@pytest.fixture
+def students(db):
+    db.session.add_all([Student(roll_no=f'C{i}', name=f'Student {i}', department=('CSE', 'ECE')[i % 2],
+                                semester=i % 3 + 1) for i in range(6)])
+    db.session.add(Subject(code='CACHE', name='Caching'))
+    db.session.commit()
+    return Student.query.order_by(Student.roll_no).all()
+
+def facets_cached():
+    return cache_get(FACETS_CACHE_KEY) is not None
+
+def test_facets_are_cached_until_a_facet_column_changes(db, students):
+    assert student_facets()['departments'] == [['CSE', 3], ['ECE', 3]]
+    assert facets_cached()
+
+    students[0].name = 'Renamed'
+    db.session.commit()
+    assert facets_cached()
+
+    students[0].department = 'MECH'
+    db.session.commit()
+    assert not facets_cached()
+    assert ['MECH', 1] in student_facets()['departments']
+
+def test_deactivating_a_student_drops_the_facets(db, students):
+    student_facets()
+    students[1].is_active = False
+    db.session.commit()
+    assert not facets_cached()
+    assert student_facets()['departments'] == [['CSE', 3], ['ECE', 2]]
+
+def test_rolled_back_change_keeps_the_facets(db, students):
+    student_facets()
+    students[1].semester = 8
+    db.session.flush()
+    db.session.rollback()
+    assert facets_cached()
+
+def test_student_import_drops_the_facets(db, students, admin, tmp_path):
+    student_facets()
+    import_csv(db, admin, tmp_path, 'import_students', STUDENT_HEADER, ['C9,Imported,,,,CIVIL,2'])
+    assert not facets_cached()
+    assert ['CIVIL', 1] in student_facets()['departments']
+
+@pytest.fixture
+def result_pages(app, db, students):
+    subject = Subject.query.filter_by(code='CACHE').one()
+    db.session.add_all([Mark(student_id=student.id, subject_id=subject.id, marks_obtained=70, total_marks=100.0)
+                        for student in students])
+    db.session.commit()
+    # Anonymous visitors, whose pages are the cached ones
+    visitor = app.test_client()
+    for student in students:
+        assert visitor.get(f'/view_result/{student.roll_no}').status_code == 200
+    assert all(cached_result_page(student.roll_no) for student in students)
+    return visitor
+
+def cached_roll_nos(students):
+    return {student.roll_no for student in students if cached_result_page(student.roll_no) is not None}
+
+def test_student_edit_drops_only_its_result_page(db, students, result_pages):
+    students[0].name = 'Renamed Student'
+    db.session.commit()
+    assert cached_roll_nos(students) == {student.roll_no for student in students[1:]}
+    assert 'Renamed Student' in result_pages.get('/view_result/C0').get_data(as_text=True)
+
+def test_mark_edit_drops_the_result_page(db, students, result_pages):
+    mark = Mark.query.filter_by(student_id=students[2].id).one()
+    mark.marks_obtained = 12
+    db.session.commit()
+    assert 'C2' not in cached_roll_nos(students)
+
+def test_deactivated_student_page_is_dropped(db, students, result_pages):
+    students[3].is_active = False
+    db.session.commit()
+    assert 'C3' not in cached_roll_nos(students)
+    assert result_pages.get('/view_result/C3').status_code == 404
+
+def test_subject_rename_drops_every_result_page(db, students, result_pages):
+    Subject.query.filter_by(code='CACHE').one().name = 'Renamed Subject'
+    db.session.commit()
+    assert cached_roll_nos(students) == set()
+
+def test_marks_import_drops_the_imported_students_pages(db, students, result_pages, admin, tmp_path):
+    import_csv(db, admin, tmp_path, 'import_marks', MARK_HEADER, ['C1,CACHE,99,100,Final', 'C4,CACHE,98,100,Final'])
+    assert cached_roll_nos(students) == {'C0', 'C2', 'C3', 'C5'}
+    assert '99' in result_pages.get('/view_result/C1').get_data(as_text=True)
+
+def test_rolled_back_edit_keeps_the_result_page(db, students, result_pages):
+    students[0].name = 'Never Committed'
+    db.session.flush()
+    db.session.rollback()
+    assert 'C0' in cached_roll_nos(students)
@@ -0,0 +1,94 @@
+import random
+import pytest
+from sqlalchemy.orm import selectinload
+from models import Student, Subject, Mark, GRADE_THRESHOLDS, grade_for_percentage
+from summaries import grade_distribution, top_performers
+
+def seed(db, rng, students=60, subjects=6):
+    subject_rows = [Subject(code=f'SUB{i}', name=f'Subject {i}') for i in range(subjects)]
+    student_rows = [Student(roll_no=f'R{i:04d}', name=f'Student {i}', is_active=rng.random() > 0.15)
+                    for i in range(students)]
+    db.session.add_all(subject_rows + student_rows)
+    db.session.flush()
+
+    for student in student_rows:
+        # Some students have no marks at all
+        for subject in rng.sample(subject_rows, rng.randint(0, subjects)):
+            total = rng.choice([50.0, 100.0, 100.0, 0.0])
+            db.session.add(Mark(
+                student_id=student.id,
+                subject_id=subject.id,
+                total_marks=total,
+                # Unscored marks still count toward the total, as in calculate_percentage()
+                marks_obtained=None if rng.random() < 0.1 else round(rng.uniform(0, total), 1),
+                exam_type=rng.choice(['Final', 'Mid-term'])
+            ))
+    db.session.commit()
+    return student_rows
+
+def with_marks(**filters):
+    """Students with their marks loaded, for the per-object reference calculations"""
+    return Student.query.options(selectinload(Student.marks)).filter_by(**filters).all()
+
+def python_percentages():
+    return {student.id: student.calculate_percentage() for student in with_marks()}
+
+def python_grades(db):
+    grades = {}
+    for student in with_marks(is_active=True):
+        grades[student.get_grade()] = grades.get(student.get_grade(), 0) + 1
+    return grades
+
+@pytest.mark.parametrize('seed_value', [1, 2, 3, 4, 5])
+def test_grade_distribution_matches_python_grading(db, seed_value):
+    seed(db, random.Random(seed_value))
+    assert grade_distribution() == python_grades(db)
+
+@pytest.mark.parametrize('seed_value', [1, 2, 3, 4, 5])
+def test_top_performers_match_python_percentages(db, seed_value):
+    seed(db, random.Random(seed_value))
+    expected = sorted(
+        (student for student in with_marks(is_active=True) if student.marks),
+        key=lambda student: (-student.calculate_percentage(), student.id)
+    )[:10]
+
+    top = top_performers(limit=10)
+    assert [row['percentage'] for row in top] == pytest.approx([s.calculate_percentage() for s in expected])
+    percentages = python_percentages()
+    for row in top:
+        assert row['percentage'] == pytest.approx(percentages[row['student'].id])
+        assert row['grade'] == grade_for_percentage(percentages[row['student'].id])
+
+def test_aggregates_follow_mark_edits(db):
+    rng = random.Random(42)
+    students = seed(db, rng)
+    marks = Mark.query.all()
+    for mark in rng.sample(marks, 20):
+        mark.marks_obtained = round(rng.uniform(0, mark.total_marks or 100), 1)
+    for mark in rng.sample(marks, 10):
+        db.session.delete(mark)
+    rng.choice(students).is_active = False
+    db.session.commit()
+
+    assert grade_distribution() == python_grades(db)
+    percentages = python_percentages()
+    for row in top_performers(limit=10):
+        assert row['percentage'] == pytest.approx(percentages[row['student'].id])
+
+def test_grade_boundaries_match_grade_for_percentage(db):
+    subject = Subject(code='EDGE', name='Boundaries')
+    db.session.add(subject)
+    db.session.flush()
+    # Exactly on every cut-off, and just below it
+    for i, percentage in enumerate(p for threshold, _ in GRADE_THRESHOLDS for p in (threshold, threshold - 0.1)):
+        student = Student(roll_no=f'E{i:03d}', name=f'Edge {i}')
+        db.session.add(student)
+        db.session.flush()
+        db.session.add(Mark(student_id=student.id, subject_id=subject.id, marks_obtained=percentage, total_marks=100.0))
+    db.session.commit()
+
+    expected = {}
+    for student in with_marks():
+        grade = grade_for_percentage(student.calculate_percentage())
+        expected[grade] = expected.get(grade, 0) + 1
+    assert grade_distribution() == expected
@@ -0,0 +1,73 @@
+import os
+import csv
+from io import BytesIO, StringIO
+import pytest
+from openpyxl import load_workbook
+from models import Student, Subject, Mark
+
+@pytest.fixture
+def results(db, admin):
+    subjects = [Subject(code='CS101', name='Programming'), Subject(code='MA101', name='Calculus')]
+    students = [Student(roll_no=f'E{i:03d}', name=f'Student {i}', department='CSE', semester=3) for i in range(5)]
+    db.session.add_all(subjects + students)
+    db.session.flush()
+    for i, student in enumerate(students):
+        db.session.add(Mark(student_id=student.id, subject_id=subjects[0].id, marks_obtained=50 + i,
+                            total_marks=100.0, exam_type='Final'))
+        if i % 2 == 0:
+            db.session.add(Mark(student_id=student.id, subject_id=subjects[1].id, marks_obtained=70 + i,
+                                total_marks=100.0, exam_type='Final'))
+    # Inactive students are left out of the export
+    db.session.add(Student(roll_no='E999', name='Former Student', is_active=False))
+    db.session.commit()
+    return students
+
+def expected_rows():
+    return [[f'E{i:03d}', 50.0 + i, 70.0 + i if i % 2 == 0 else None] for i in range(5)]
+
+def marks_cells(row):
+    # Roll No and the last two columns; CSV gives strings and xlsx stores whole floats as ints
+    return [row[0]] + [float(cell) if cell not in ('', None) else None for cell in row[-2:]]
+
+def test_csv_export_streams_one_row_per_active_student(client, results, monkeypatch):
+    # Several flushes of the stream, and a partial one at the end
+    monkeypatch.setattr('exports.EXPORT_CHUNK_SIZE', 2)
+    response = client.get('/export_results/csv')
+    assert response.status_code == 200
+    assert response.is_streamed
+    rows = list(csv.reader(StringIO(response.get_data(as_text=True))))
+    assert rows[0][-2:] == ['CS101 (Final)', 'MA101 (Final)']
+    assert [marks_cells(row) for row in rows[1:]] == expected_rows()
+
+def test_excel_export_matches_csv(client, results):
+    response = client.get('/export_results/excel')
+    assert response.status_code == 200
+    sheet = load_workbook(BytesIO(response.get_data())).active
+    rows = list(sheet.iter_rows(values_only=True))
+    csv_rows = list(csv.reader(StringIO(client.get('/export_results/csv').get_data(as_text=True))))
+    assert [str(cell) for cell in rows[0]] == csv_rows[0]
+    assert [marks_cells(row) for row in rows[1:]] == expected_rows()
+    assert len(rows) == len(csv_rows)
+
+@pytest.mark.parametrize('format, extension', [('csv', 'csv'), ('excel', 'xlsx')])
+def test_export_revalidates_until_data_changes(app, db, client, results, format, extension):
+    first = client.get(f'/export_results/{format}')
+    etag = first.get_etag()[0]
+    assert first.status_code == 200 and etag
+    body = first.get_data()
+    # The first download, once read to the end, left the artifact in the cache for the next one
+    artifacts = [name for name in os.listdir(app.config['EXPORT_CACHE_FOLDER']) if name.endswith(f'.{extension}')]
+    assert any(etag.split('-', 1)[1] in name for name in artifacts)
+    cached = client.get(f'/export_results/{format}')
+    assert cached.get_etag()[0] == etag
+    assert cached.get_data() == body
+
+    revalidated = client.get(f'/export_results/{format}', headers={'If-None-Match': f'"{etag}"'})
+    assert revalidated.status_code == 304
+    assert revalidated.get_data() == b''
+
+    db.session.add(Student(roll_no='E100', name='New Student', department='CSE', semester=3))
+    db.session.commit()
+    changed = client.get(f'/export_results/{format}', headers={'If-None-Match': f'"{etag}"'})
+    assert changed.status_code == 200
+    assert changed.get_etag()[0] != etag
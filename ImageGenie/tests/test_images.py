@@ -0,0 +1,43 @@
+import os
+import pytest
+from PIL import Image
+from images import PHOTO_SIZES, render_derivatives, derivative_name, derivative_sizes, photo_srcset, photo_url
+
+@pytest.fixture
+def photo(app, tmp_path):
+    def render(width, height, filename):
+        source = tmp_path / filename
+        Image.new('RGB', (width, height), 'navy').save(source, 'JPEG')
+        with app.test_request_context():
+            render_derivatives(str(source), filename)
+        return filename
+    return render
+
+def derivative_path(app, filename, size, extension):
+    return os.path.join(app.config['UPLOAD_FOLDER'], derivative_name(filename, size, extension))
+
+def test_every_size_is_rendered_at_its_width(app, photo):
+    filename = photo(800, 600, 'large.jpg')
+    with app.app_context():
+        assert derivative_sizes(filename) == PHOTO_SIZES
+        for size in PHOTO_SIZES:
+            for extension in ('webp', 'jpg'):
+                with Image.open(derivative_path(app, filename, size, extension)) as image:
+                    assert image.size == (size, size)
+
+def test_sizes_larger_than_the_photo_are_skipped(app, photo):
+    # Cropped to 150x150, which fills the 64 and 128 sizes but not 320
+    filename = photo(200, 150, 'small.jpg')
+    with app.test_request_context():
+        assert derivative_sizes(filename) == (64, 128)
+        assert not os.path.exists(derivative_path(app, filename, 320, 'jpg'))
+        assert photo_srcset(filename, 'webp') == ('/uploads/derivatives/small_64.webp 64w, '
+                                                  '/uploads/derivatives/small_128.webp 128w')
+        assert photo_url(filename, 150).endswith('/small_128.jpg')
+
+def test_photo_smaller_than_every_size_is_served_as_uploaded(app, photo):
+    filename = photo(40, 40, 'tiny.jpg')
+    with app.test_request_context():
+        assert derivative_sizes(filename) == ()
+        assert photo_srcset(filename, 'jpg') == ''
+        assert photo_url(filename).endswith('/tiny.jpg')
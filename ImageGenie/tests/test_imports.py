@@ -0,0 +1,122 @@
+import importers
+import rollups
+from models import Student, Subject, Mark, BulkOperation, StudentResultSummary
+from importers import run_import
+from rollups import rebuild_rollups
+from test_rollups import rollup_rows
+
+STUDENT_HEADER = 'roll_no,name,email,phone,date_of_birth,department,semester,admission_year,address'
+MARK_HEADER = 'roll_no,subject_code,marks_obtained,total_marks,exam_type'
+
+def import_csv(db, admin, tmp_path, operation_type, header, lines, chunk_size=3):
+    path = tmp_path / f'{operation_type}.csv'
+    path.write_text(header + '\n' + '\n'.join(lines) + '\n')
+    bulk_op = BulkOperation(operation_type=operation_type, status='processing', user_id=admin.id)
+    db.session.add(bulk_op)
+    db.session.commit()
+    run_import(bulk_op, str(path), skip_header=True, chunk_size=chunk_size)
+    return bulk_op
+
+def marks_by_roll_no(db):
+    return sorted(tuple(row) for row in db.session.query(Student.roll_no, Mark.marks_obtained).join(Mark.student))
+
+def seed(db):
+    db.session.add_all([Subject(code='MATH', name='Mathematics'), Subject(code='PHY', name='Physics')])
+    db.session.add_all([Student(roll_no=f'I{i}', name=f'Student {i}', department='CSE') for i in range(4)])
+    db.session.commit()
+
+def test_student_import_rejects_duplicates_and_invalid_rows(db, admin, tmp_path):
+    db.session.add(Student(roll_no='EXIST', name='Existing', email='existing@example.com'))
+    db.session.commit()
+
+    bulk_op = import_csv(db, admin, tmp_path, 'import_students', STUDENT_HEADER, [
+        'S1,One,one@example.com',
+        'S2,Two,two@example.com',
+        'S1,Repeated,repeated@example.com',   # Same chunk as the first S1
+        'S3,Three,one@example.com',           # Email taken by a committed chunk
+        'EXIST,Again',
+        'S4,Four,,,,CSE,5,2023',
+        'S5,Five,,,31-12-2001',
+        'S6',
+    ])
+
+    assert (bulk_op.status, bulk_op.processed_records, bulk_op.failed_records, bulk_op.total_records) == \
+        ('completed', 3, 5, 8)
+    assert bulk_op.error_log.splitlines() == [
+        'Line 4: Student with roll number S1 already exists',
+        'Line 5: Email one@example.com already registered',
+        'Line 6: Student with roll number EXIST already exists',
+        'Line 8: Invalid date format for S5',
+        'Line 9: Insufficient data',
+    ]
+    students = {student.roll_no: student for student in db.session.query(Student)}
+    assert sorted(students) == ['EXIST', 'S1', 'S2', 'S4']
+    assert students['S1'].name == 'One'
+    assert (students['S4'].department, students['S4'].semester, students['S4'].admission_year) == ('CSE', 5, 2023)
+
+def test_import_error_log_keeps_the_first_errors(db, admin, tmp_path, monkeypatch):
+    monkeypatch.setattr(importers, 'MAX_LOGGED_ERRORS', 2)
+    bulk_op = import_csv(db, admin, tmp_path, 'import_students', STUDENT_HEADER, [f'X{i}' for i in range(5)])
+    assert bulk_op.failed_records == 5
+    assert bulk_op.error_log.splitlines() == ['Line 2: Insufficient data', 'Line 3: Insufficient data',
+                                              '... 3 more errors not shown']
+
+def test_import_errors_are_logged_in_line_order(db, admin, tmp_path, monkeypatch):
+    # Line 4 fails to parse while the chunk of lines 2, 3 and 5 is read, before line 3 fails to write
+    lines = ['A1,One', 'A1,Repeated', 'A2', 'A3,Three', 'A4,Four']
+    bulk_op = import_csv(db, admin, tmp_path, 'import_students', STUDENT_HEADER, lines)
+    assert bulk_op.error_log.splitlines() == ['Line 3: Student with roll number A1 already exists',
+                                              'Line 4: Insufficient data']
+
+    # With room for one error, it is still the earliest
+    db.session.query(Student).delete()
+    db.session.commit()
+    monkeypatch.setattr(importers, 'MAX_LOGGED_ERRORS', 1)
+    bulk_op = import_csv(db, admin, tmp_path, 'import_students', STUDENT_HEADER, lines)
+    assert bulk_op.error_log.splitlines() == ['Line 3: Student with roll number A1 already exists',
+                                              '... 1 more errors not shown']
+
+def test_marks_import_upserts_and_refreshes_summaries(db, admin, tmp_path):
+    seed(db)
+    import_csv(db, admin, tmp_path, 'import_marks', MARK_HEADER,
+               ['I0,MATH,50,100,Final', 'I1,MATH,60,100,Final', 'I0,PHY,30,50,Final'])
+
+    bulk_op = import_csv(db, admin, tmp_path, 'import_marks', MARK_HEADER, [
+        'I0,MATH,80,100,Final',
+        'I9,MATH,70,100,Final',
+        'I1,CHEM,70,100,Final',
+        'I1,MATH,70,100,Final',
+        'I1,MATH,72,100,Final',   # The later line for the same mark wins
+        'I2,PHY,40,50,Midterm',
+    ])
+
+    assert (bulk_op.status, bulk_op.processed_records, bulk_op.failed_records) == ('completed', 4, 2)
+    assert bulk_op.error_log.splitlines() == ['Line 3: Student I9 not found', 'Line 4: Subject CHEM not found']
+    assert marks_by_roll_no(db) == [('I0', 30), ('I0', 80), ('I1', 72), ('I2', 40)]
+    summaries = {
+        roll_no: (summary.total_obtained, summary.total_possible, summary.mark_count)
+        for roll_no, summary in db.session.query(Student.roll_no, StudentResultSummary)
+        .join(StudentResultSummary, StudentResultSummary.student_id == Student.id)
+    }
+    assert summaries['I0'] == (110, 150, 2)
+    assert summaries['I1'] == (72, 100, 1)
+    assert summaries['I2'] == (40, 50, 1)
+    kept = rollup_rows(db)
+    rebuild_rollups()
+    assert kept == rollup_rows(db)
+
+def test_marks_import_without_on_conflict(db, admin, tmp_path, monkeypatch):
+    # As on a database other than PostgreSQL and SQLite
+    monkeypatch.setattr(importers, 'upsert_marks_statement', lambda: None)
+    monkeypatch.setattr(rollups, 'add_to_rollups_statement', lambda dialect: None)
+    seed(db)
+
+    import_csv(db, admin, tmp_path, 'import_marks', MARK_HEADER, ['I0,MATH,50,100,Final', 'I1,MATH,60,100,Final'])
+    bulk_op = import_csv(db, admin, tmp_path, 'import_marks', MARK_HEADER,
+                         ['I0,MATH,75,100,Final', 'I2,PHY,40,50,Final', 'I3,PHY,30,50,Final', 'I1,MATH,65,100,Final'])
+
+    assert (bulk_op.status, bulk_op.processed_records, bulk_op.failed_records) == ('completed', 4, 0)
+    assert marks_by_roll_no(db) == [('I0', 75), ('I1', 65), ('I2', 40), ('I3', 30)]
+    kept = rollup_rows(db)
+    rebuild_rollups()
+    assert kept == rollup_rows(db)
@@ -0,0 +1,61 @@
+import io
+import os
+from datetime import datetime, timedelta
+from models import Student, BulkOperation
+from jobs import work, requeue_stale_jobs, claim_next_job
+
+def upload(client, operation, content):
+    return client.post('/bulk_operations', data={
+        'operation': operation,
+        'skip_header': 'y',
+        'csv_file': (io.BytesIO(content.encode()), 'upload.csv')
+    }, content_type='multipart/form-data')
+
+def test_uploaded_import_is_queued_then_run_by_the_worker(client, db, admin):
+    response = upload(client, 'import_students', 'roll_no,name\nJ1,First\nJ2,Second\n')
+    assert response.status_code == 302
+
+    bulk_op = BulkOperation.query.one()
+    assert bulk_op.status == 'pending'
+    operation_id, source_file = bulk_op.id, bulk_op.source_file
+    assert os.path.exists(source_file)
+
+    # The worker removes the session when it is done, as between jobs
+    work(once=True)
+
+    bulk_op = db.session.get(BulkOperation, operation_id)
+    assert (bulk_op.status, bulk_op.processed_records, bulk_op.failed_records) == ('completed', 2, 0)
+    assert bulk_op.source_file is None and not os.path.exists(source_file)
+    assert {student.roll_no for student in Student.query} == {'J1', 'J2'}
+
+    status = client.get(f'/api/bulk-operation/{operation_id}/status').get_json()
+    assert (status['status'], status['processed_records'], status['total_records']) == ('completed', 2, 2)
+
+def test_failed_job_is_marked_failed_with_its_error(db, admin):
+    bulk_op = BulkOperation(operation_type='import_marks', status='pending', user_id=admin.id,
+                            source_file='/nonexistent/upload.csv')
+    db.session.add(bulk_op)
+    db.session.commit()
+    operation_id = bulk_op.id
+
+    work(once=True)
+
+    bulk_op = db.session.get(BulkOperation, operation_id)
+    assert bulk_op.status == 'failed'
+    assert 'No such file' in bulk_op.error_log
+
+def test_stale_processing_jobs_are_requeued(db, admin):
+    stale = BulkOperation(operation_type='import_students', status='processing', user_id=admin.id,
+                          started_at=datetime.utcnow() - timedelta(hours=5))
+    running = BulkOperation(operation_type='import_students', status='processing', user_id=admin.id,
+                            started_at=datetime.utcnow() - timedelta(minutes=5))
+    db.session.add_all([stale, running])
+    db.session.commit()
+
+    assert requeue_stale_jobs(timeout=3600) == 1
+    db.session.expire_all()
+    assert (stale.status, stale.started_at) == ('pending', None)
+    assert running.status == 'processing'
+
+    # Claiming picks the requeued job up again
+    assert claim_next_job().id == stale.id
@@ -0,0 +1,40 @@
+import pytest
+from models import Student, Subject, Mark, AuditLog, BulkOperation
+
+@pytest.fixture
+def seeded(db, admin):
+    subjects = [Subject(code='CS101', name='Programming', department='CSE', credits=4),
+                Subject(code='MA101', name='Calculus', department='MATH'),
+                Subject(code='GE101', name='Communication')]
+    students = [Student(roll_no=f'P{i:03d}', name=f'Student {i}', department=('CSE', 'ECE', None)[i % 3],
+                        semester=i % 8 + 1) for i in range(12)]
+    db.session.add_all(subjects + students)
+    db.session.flush()
+    for student in students:
+        for subject in subjects:
+            db.session.add(Mark(student_id=student.id, subject_id=subject.id,
+                                marks_obtained=40 + student.id % 60, total_marks=100.0))
+    db.session.add(AuditLog(user_id=admin.id, action='LOGIN', table_name='users', record_id=admin.id))
+    db.session.add(BulkOperation(operation_type='import_students', status='completed', user_id=admin.id))
+    db.session.commit()
+    return students
+
+@pytest.mark.parametrize('path', ['/', '/students', '/subjects', '/add_marks', '/dashboard', '/bulk_operations',
+                                  '/view_result/P004'])
+def test_page_renders_without_lazy_loads(client, seeded, path):
+    # Raiseload is on for the suite, so a relationship a page did not eager-load fails it
+    response = client.get(path)
+    assert response.status_code == 200
+
+def test_subjects_page_counts_enrollments(client, seeded):
+    html = client.get('/subjects').get_data(as_text=True)
+    # 12 students x 3 subjects, one of them without a department
+    assert '<h3 class="text-warning">36</h3>' in html
+    assert '<td><strong>No Department</strong></td>' in html
+
+def test_anonymous_result_page_is_served_from_cache(app, db, seeded):
+    client = app.test_client()
+    first = client.get('/view_result/P004')
+    second = client.get('/view_result/P004')
+    assert first.status_code == second.status_code == 200
+    assert first.get_data() == second.get_data()
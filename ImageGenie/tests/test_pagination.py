@@ -0,0 +1,57 @@
+import random
+import pytest
+from models import Student
+from pagination import keyset_paginate, encode_cursor, decode_cursor
+
+@pytest.fixture
+def students(db):
+    rng = random.Random(5)
+    numbers = list(range(53))
+    rng.shuffle(numbers)
+    # Inserted out of order, with many students sharing a semester
+    db.session.add_all([Student(roll_no=f'K{i:03d}', name=f'Student {i}', semester=rng.randint(1, 4),
+                                is_active=i % 9 != 0) for i in numbers])
+    db.session.commit()
+
+def walk(query, keys, per_page):
+    pages = [keyset_paginate(query, keys, per_page=per_page)]
+    while pages[-1].has_next:
+        pages.append(keyset_paginate(query, keys, after=pages[-1].next_cursor, per_page=per_page))
+    return pages
+
+@pytest.mark.parametrize('sort', ['roll_no', 'semester_id'])
+def test_cursor_pages_match_offset_pages(db, students, sort):
+    keys = [Student.roll_no] if sort == 'roll_no' else [Student.semester, Student.id]
+    query = Student.query.filter_by(is_active=True)
+
+    pages = walk(query, keys, per_page=10)
+    offset_pages = [query.order_by(*keys).offset(start).limit(10).all() for start in range(0, query.count(), 10)]
+    assert [page.items for page in pages] == offset_pages
+    assert not pages[0].has_prev and all(page.has_prev for page in pages[1:])
+
+    # Walking back from the last page with prev cursors gives the same pages
+    page = pages[-1]
+    for expected in reversed(pages[:-1]):
+        page = keyset_paginate(query, keys, before=page.prev_cursor, per_page=10)
+        assert page.items == expected.items
+    assert not page.has_prev
+
+@pytest.mark.parametrize('token', ['not a cursor', '!!!', encode_cursor({'roll_no': 'K010'}),
+                                   encode_cursor(['K010', 'extra']), encode_cursor('K010')])
+def test_malformed_cursor_gives_the_first_page(db, students, token):
+    assert decode_cursor(token, 1) is None
+    query = Student.query.filter_by(is_active=True)
+    first = keyset_paginate(query, [Student.roll_no], per_page=10)
+    assert keyset_paginate(query, [Student.roll_no], after=token, per_page=10).items == first.items
+    assert keyset_paginate(query, [Student.roll_no], before=token, per_page=10).items == first.items
+
+def test_student_list_follows_cursors(client, students, admin):
+    first = client.get('/students')
+    assert first.status_code == 200
+    html = first.get_data(as_text=True)
+    assert 'K001' in html and 'K025' not in html
+
+    cursor = encode_cursor(['K020'])
+    html = client.get(f'/students?after={cursor}').get_data(as_text=True)
+    assert 'K021' in html and 'K020' not in html
+    assert client.get('/students?after=garbage').status_code == 200
@@ -0,0 +1,92 @@
+import random
+import threading
+import time
+from models import Student, Subject, Mark, MarkRollup, BulkOperation
+from importers import run_import, write_marks, prepare_marks_import, ImportProgress
+from rollups import rebuild_rollups
+
+def rollup_rows(db):
+    db.session.expire_all()
+    return sorted((row.month, row.subject_id, row.department, row.student_active, row.exam_type,
+                   row.mark_count, row.scored_count, round(row.marks_sum, 6)) for row in MarkRollup.query.all())
+
+def assert_matches_rebuild(db):
+    kept = rollup_rows(db)
+    rebuild_rollups()
+    assert kept == rollup_rows(db)
+    return kept
+
+def seed(db):
+    db.session.add_all([Subject(code=f'R{i}', name=f'Rollup {i}') for i in range(4)])
+    # Every department value the rollup key distinguishes, including none
+    db.session.add_all([Student(roll_no=f'RS{i:03d}', name=f'Student {i}', department=('CSE', 'ECE', None)[i % 3],
+                                is_active=i % 7 != 0) for i in range(40)])
+    db.session.commit()
+
+def import_marks(db, admin, tmp_path, lines, name):
+    path = tmp_path / name
+    path.write_text('roll_no,subject_code,marks_obtained,total_marks,exam_type\n' + '\n'.join(lines) + '\n')
+    bulk_op = BulkOperation(operation_type='import_marks', status='processing', user_id=admin.id)
+    db.session.add(bulk_op)
+    db.session.commit()
+    # Small chunks, so one bucket is added to by several transactions
+    return run_import(bulk_op, str(path), skip_header=True, chunk_size=25)
+
+def random_lines(rng, count):
+    return [f'RS{rng.randrange(40):03d},R{rng.randrange(4)},{rng.randint(0, 100)},100,'
+            f'{rng.choice(["Final", "Mid-term", "Quiz"])}' for _ in range(count)]
+
+def test_imports_keep_rollups_equal_to_a_rebuild(db, admin, tmp_path):
+    seed(db)
+    rng = random.Random(7)
+    import_marks(db, admin, tmp_path, random_lines(rng, 200), 'first.csv')
+    first = assert_matches_rebuild(db)
+    assert sum(row[5] for row in first) == Mark.query.count()
+
+    # Mostly the same marks again with new scores, plus some new ones
+    progress = import_marks(db, admin, tmp_path, random_lines(random.Random(7), 200) + random_lines(rng, 60),
+                            'again.csv')
+    assert progress.failed == 0
+    again = assert_matches_rebuild(db)
+    assert sum(row[5] for row in again) == Mark.query.count()
+    # Students without a department are counted under ''
+    assert any(row[2] == '' for row in again)
+
+def test_orm_edits_keep_rollups_equal_to_a_rebuild(db, admin, tmp_path):
+    seed(db)
+    import_marks(db, admin, tmp_path, random_lines(random.Random(3), 120), 'marks.csv')
+    subject = Subject.query.filter_by(code='R3').one()
+    marks = Mark.query.order_by(Mark.id).all()
+    marks[0].marks_obtained = None
+    marks[1].subject_id = subject.id if marks[1].subject_id != subject.id else marks[2].subject_id
+    marks[1].exam_type = 'Moved'
+    db.session.delete(marks[3])
+    student = Student.query.filter_by(roll_no='RS001').one()
+    student.department = 'MECH'
+    db.session.commit()
+    assert_matches_rebuild(db)
+
+def test_concurrent_imports_of_the_same_new_mark(app, db):
+    seed(db)
+
+    def write(value, hold, written):
+        with app.app_context():
+            record = {'roll_no': 'RS001', 'subject_code': 'R0', 'marks_obtained': value, 'total_marks': 100.0,
+                      'exam_type': 'Final', 'exam_date': None}
+            write_marks([(2, record)], ImportProgress(None), prepare_marks_import())
+            written.set()
+            time.sleep(hold)
+            db.session.commit()
+
+    # The second import starts while the first still holds its chunk open
+    first_written, second_written = threading.Event(), threading.Event()
+    first = threading.Thread(target=write, args=(40.0, 0.5, first_written))
+    first.start()
+    first_written.wait()
+    second = threading.Thread(target=write, args=(70.0, 0, second_written))
+    second.start()
+    first.join()
+    second.join()
+
+    rows = assert_matches_rebuild(db)
+    assert [(row[5], row[6], row[7]) for row in rows] == [(1, 1, 70.0)]